@@ -0,0 +1,83 @@
+#! /usr/bin/env python
+
+"""Benchmarks the interpreter startup cost of the ``lacosmic`` modules.
+
+Each module is imported in a fresh interpreter, since a warm
+``sys.modules`` would hide the cost. The time of a bare interpreter
+is subtracted, and the heavy backends (``pyraf``, ``pylab``,
+``matplotlib``, ``astropy``) found in ``sys.modules`` after the import
+are listed. None should appear for the command line interface.
+
+Author:
+
+    C.M. Gosmeyer
+
+Use:
+
+    >>> python benchmarks/bench_import_time.py --repeat 10
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+MODULES = ['lacosmic.cli',
+           'lacosmic.lacosmic_tools',
+           'lacosmic.count_masked_pixels',
+           'lacosmic.run_lacosmic']
+
+HEAVY_MODULES = ['pyraf', 'pylab', 'matplotlib', 'img_scale', 'astropy']
+
+CHECK = "import sys; import {0}; " + \
+        "print(','.join(m for m in {1} if m in sys.modules))"
+
+#-------------------------------------------------------------------------------#
+
+def time_command(code, repeat):
+    """Returns the best wall time, in seconds, of running `code` in a
+    fresh interpreter `repeat` times.
+    """
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', code])
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def heavy_modules_loaded(module):
+    """Returns the heavy backends left in ``sys.modules`` after
+    importing `module`.
+    """
+    out = subprocess.check_output([sys.executable, '-c', \
+        CHECK.format(module, repr(HEAVY_MODULES))])
+    return out.decode().strip()
+
+
+#-------------------------------------------------------------------------------#
+
+def bench_import_time(repeat=5):
+    """Prints the import time of each module over a bare interpreter."""
+    baseline = time_command('pass', repeat)
+    print('{0:<32} {1:>10}  {2}'.format('module', 'ms', 'heavy backends'))
+    for module in MODULES:
+        try:
+            elapsed = time_command('import ' + module, repeat)
+            heavy = heavy_modules_loaded(module)
+        except subprocess.CalledProcessError:
+            print('{0:<32} {1:>10}'.format(module, 'failed'))
+            continue
+        print('{0:<32} {1:>10.1f}  {2}'.format(module, \
+            (elapsed - baseline) * 1000., heavy or '-'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', dest='repeat', type=int, default=5, \
+        help='Number of fresh interpreters per module.')
+    args = parser.parse_args()
+
+    bench_import_time(args.repeat)
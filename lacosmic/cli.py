@@ -0,0 +1,253 @@
+#! /usr/bin/env python
+
+"""Command line interface for the "lacosmic" wrapper.
+
+Installed as the ``lacosmic`` console script. Each subcommand imports
+its backend (``PyRAF``, ``pylab``) only when it is run, so the light
+commands start without paying for the ``IRAF`` and plotting startup.
+
+Author:
+
+    C.M. Gosmeyer
+
+Use:
+
+    >>> lacosmic run --origin ./ --dest ./
+    >>> lacosmic sweep --sigclip 9.0 9.5 10.0 --objlim 2 5
+    >>> lacosmic count --orig masks/ --dest plots/ --filt F218W
+    >>> lacosmic sort --origin ./ --dest ./
+    >>> lacosmic atlas --origin ./ --dest ./
+"""
+
+import argparse
+
+#-------------------------------------------------------------------------------#
+
+def default_lacos_im_path():
+    """Returns the path to ``lacos_im.cl`` recorded in ``set_paths.py``,
+    or '' (the Current Working Directory) if setup has not been run.
+    """
+    try:
+        from set_paths import set_paths
+    except ImportError:
+        return ''
+    return set_paths()['lacos_im'] + '/'
+
+
+#-------------------------------------------------------------------------------#
+
+def do_run(args):
+    """Runs LACosmic over the FLTs in `args.origin`."""
+    from lacosmic.run_lacosmic import run_lacosmic_main
+
+    path_to_lacos_im = args.path_to_lacos_im
+    if path_to_lacos_im is None:
+        path_to_lacos_im = default_lacos_im_path()
+
+    run_lacosmic_main(origin=args.origin, dest=args.dest, \
+                      path_to_lacos_im=path_to_lacos_im, \
+                      temp_folder=args.temp_folder, \
+                      create_png=args.create_png, \
+                      engine=args.engine, \
+                      noise_model=args.noise_model, \
+                      dq_bits=args.dq_bits, \
+                      cache_dir=args.cache_dir, \
+                      cache_size=args.cache_size, \
+                      queue_dir=args.queue_dir, \
+                      nworkers=args.nworkers, \
+                      stale_timeout=args.stale_timeout, \
+                      memory_budget=args.memory_budget, \
+                      max_workers=args.max_workers, \
+                      memory_model=args.memory_model, \
+                      prefetch=args.prefetch, \
+                      write_threads=args.write_threads)
+
+
+def do_sweep(args):
+    """Permutates LACosmic parameters over the FLTs in the
+    Current Working Directory.
+    """
+    from lacosmic.run_lacosmic_tester import run_lacosmic_tester
+
+    path_to_lacos_im = args.path_to_lacos_im
+    if path_to_lacos_im is None:
+        path_to_lacos_im = default_lacos_im_path()
+
+    run_lacosmic_tester(args.sigclip, args.sigfrac, args.objlim, args.niter, \
+                        count_masked_pixels=args.count_masked_pixels, \
+                        path_to_lacos_im=path_to_lacos_im)
+
+
+def do_count(args):
+    """Counts the masked pixels in the mask FITS files."""
+    from lacosmic.count_masked_pixels import main_count_masked_pixels
+
+    main_count_masked_pixels(args.orig, args.dest, args.filt)
+
+
+def do_sort(args):
+    """Sorts clean, mask, and PNG outputs into their directories."""
+    from lacosmic.run_lacosmic import sort_files
+
+    sort_files(origin=args.origin, dest=args.dest, \
+               keep_masks=args.keep_masks, temp_folder=args.temp_folder)
+
+
+def do_atlas(args):
+    """Creates the review atlas of the FLTs in `args.origin`."""
+    from lacosmic.review_atlas import main_review_atlas
+
+    main_review_atlas(origin=args.origin, dest=args.dest, \
+                      sort_by=args.sort_by, rows_per_sheet=args.rows)
+
+
+#-------------------------------------------------------------------------------#
+
+def parse_args(argv=None):
+    """Parses command line arguments.
+
+    Parameters
+    ----------
+    argv : list of strings
+        Arguments to parse. If None, reads from ``sys.argv``.
+
+    Returns
+    -------
+    args : object
+        Containing the subcommand function, ``func``, and its
+        arguments.
+    """
+    from lacosmic.run_lacosmic import DQ_BITS
+
+    parser = argparse.ArgumentParser(prog='lacosmic', \
+        description='LACosmic wrapper for WFC3/UVIS FLTs.')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    lacos_help = "Path to lacos_im.cl. Default read from set_paths.py."
+
+    # lacosmic run
+    run_parser = subparsers.add_parser('run', \
+        help='Run LACosmic over all FLTs in a directory.')
+    run_parser.add_argument('--origin', dest='origin', type=str, default='', \
+        help='Path to FLTs. Default Current Working Directory.')
+    run_parser.add_argument('--dest', dest='dest', type=str, default='', \
+        help='Path for output dirs. Default Current Working Directory.')
+    run_parser.add_argument('--path_to_lacos_im', dest='path_to_lacos_im', \
+        type=str, default=None, help=lacos_help)
+    run_parser.add_argument('--temp_folder', dest='temp_folder', \
+        action='store_true', help='Place cleans in flt_cleans/temp_lacos/.')
+    run_parser.add_argument('--no_png', dest='create_png', \
+        action='store_false', help='Do not create diagnostic PNGs.')
+    run_parser.add_argument('--engine', dest='engine', type=str, \
+        choices=['iraf', 'python'], default='iraf', \
+        help='IRAF task or its Python port. Default iraf.')
+    run_parser.add_argument('--noise_model', dest='noise_model', type=str, \
+        choices=['median', 'err', 'header'], default='median', \
+        help='Noise model. err and header need the python engine.')
+    run_parser.add_argument('--dq_bits', dest='dq_bits', type=int, \
+        nargs='?', const=DQ_BITS, default=None, \
+        help='Exclude pixels with these DQ flags from the search. ' + \
+             'Alone, uses ' + str(DQ_BITS) + '. Needs the python engine.')
+    run_parser.add_argument('--cache_dir', dest='cache_dir', type=str, \
+        default=None, help='Cache the threshold-independent detection ' + \
+                           'maps here. Needs the python engine.')
+    run_parser.add_argument('--cache_size', dest='cache_size', type=float, \
+        default=None, help='Size cap of the cache, MB. Default 2000.')
+    run_parser.add_argument('--queue_dir', dest='queue_dir', type=str, \
+        default=None, help='Shared work queue dir. Run the same command ' + \
+                           'on each node to spread the FLTs over them.')
+    run_parser.add_argument('--nworkers', dest='nworkers', type=int, \
+        default=1, help='Queue workers to start on this node. Default 1.')
+    run_parser.add_argument('--stale_timeout', dest='stale_timeout', \
+        type=float, default=300., \
+        help='Seconds before a dead worker\'s job is reclaimed. Default 300.')
+    run_parser.add_argument('--memory_budget', dest='memory_budget', \
+        type=float, default=None, \
+        help='Run FLTs in parallel within this many MB of memory.')
+    run_parser.add_argument('--max_workers', dest='max_workers', type=int, \
+        default=None, help='Most FLTs at once under --memory_budget. ' + \
+                           'Default number of CPUs.')
+    run_parser.add_argument('--memory_model', dest='memory_model', \
+        type=str, default=None, \
+        help='JSON file to keep the learned memory per pixel in.')
+    run_parser.add_argument('--prefetch', dest='prefetch', type=int, \
+        default=None, help='Read this many FLTs ahead and write outputs ' + \
+                           'in the background. Needs the python engine.')
+    run_parser.add_argument('--write_threads', dest='write_threads', \
+        type=int, default=2, help='Threads writing outputs under ' + \
+                                  '--prefetch. Default 2.')
+    run_parser.set_defaults(func=do_run)
+
+    # lacosmic sweep
+    sweep_parser = subparsers.add_parser('sweep', \
+        help='Permutate LACosmic parameters over FLTs in the cwd.')
+    sweep_parser.add_argument('--sigclip', dest='sigclip', type=float, \
+        nargs='+', default=[9.0, 9.5, 10.0], help='sigclip values to test.')
+    sweep_parser.add_argument('--sigfrac', dest='sigfrac', type=float, \
+        nargs='+', default=[0.3, 0.4], help='sigfrac values to test.')
+    sweep_parser.add_argument('--objlim', dest='objlim', type=int, \
+        nargs='+', default=[2, 3, 4, 5], help='objlim values to test.')
+    sweep_parser.add_argument('--niter', dest='niter', type=int, \
+        nargs='+', default=[4, 5], help='niter values to test.')
+    sweep_parser.add_argument('--count_masked_pixels', \
+        dest='count_masked_pixels', action='store_true', \
+        help='Keep the clean and mask FITS of each permutation.')
+    sweep_parser.add_argument('--path_to_lacos_im', dest='path_to_lacos_im', \
+        type=str, default=None, help=lacos_help)
+    sweep_parser.set_defaults(func=do_sweep)
+
+    # lacosmic count
+    count_parser = subparsers.add_parser('count', \
+        help='Count masked pixels from *crcat.fits or *mask.fits files.')
+    count_parser.add_argument('--orig', dest='orig', type=str, required=True, \
+        help='Path to filter dirs containing *mask.fits files.')
+    count_parser.add_argument('--dest', dest='dest', type=str, required=True, \
+        help='Destination path for out plots.')
+    count_parser.add_argument('--filt', dest='filt', type=str, default=None, \
+        help='Name of filter dir to run over. By default runs over all.')
+    count_parser.set_defaults(func=do_count)
+
+    # lacosmic sort
+    sort_parser = subparsers.add_parser('sort', \
+        help='Sort clean, mask, and PNG outputs into subdirectories.')
+    sort_parser.add_argument('--origin', dest='origin', type=str, default='', \
+        help='Path to outputs. Default Current Working Directory.')
+    sort_parser.add_argument('--dest', dest='dest', type=str, default='', \
+        help='Path for output dirs. Default Current Working Directory.')
+    sort_parser.add_argument('--discard_masks', dest='keep_masks', \
+        action='store_false', help='Delete the mask files.')
+    sort_parser.add_argument('--temp_folder', dest='temp_folder', \
+        action='store_true', help='Place cleans in flt_cleans/temp_lacos/.')
+    sort_parser.set_defaults(func=do_sort)
+
+    # lacosmic atlas
+    atlas_parser = subparsers.add_parser('atlas', \
+        help='Contact sheets and HTML index of all cleans and masks.')
+    atlas_parser.add_argument('--origin', dest='origin', type=str, default='', \
+        help='Path to FLTs. Default Current Working Directory.')
+    atlas_parser.add_argument('--dest', dest='dest', type=str, default='', \
+        help='Path of the output dirs. Default Current Working Directory.')
+    atlas_parser.add_argument('--sort_by', dest='sort_by', type=str, \
+        choices=['masked_fraction', 'center_fraction', 'filename'], \
+        default='masked_fraction', \
+        help='Order of the FLTs; most masked first. Default masked_fraction.')
+    atlas_parser.add_argument('--rows', dest='rows', type=int, default=50, \
+        help='FLTs per sheet. Default 50.')
+    atlas_parser.set_defaults(func=do_atlas)
+
+    return parser.parse_args(argv)
+
+
+#-------------------------------------------------------------------------------#
+# The main.
+#-------------------------------------------------------------------------------#
+
+def main(argv=None):
+    """Entry point of the ``lacosmic`` console script."""
+    args = parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 #! /usr/bin/env python
 
 """Counts the masked pixels in `*flt.mask.fits`, which is output from
-    `LACOSMIC`.
+    `LACOSMIC`. Reads the counts from the CR catalogs, `*flt.crcat.fits`,
+    where there are any, instead of opening the masks.
 
 Author:
 
@@ -26,23 +27,24 @@ Updates:
     the other outputs.   
 """
 
+import argparse
 import glob
-import pylab
-from astropy.io import fits, ascii
+import os
 
-from set_paths import set_paths
+from astropy.io import fits, ascii
 
 
 #-------------------------------------------------------------------------------#
 
 def count_masked_pixels(orig='', dest='', filt=''):
-    """Counts the number of masked pixels (=1) in `*flt.mask.fits` 
-    files.
+    """Counts the number of masked pixels (=1) of each image, from
+    the headers of its `*crcat.fits` catalog, or from its
+    `*flt.mask.fits` if it has no catalog.
     
     Parameters
     ----------
     orig : string
-        Path to mask files.
+        Path to catalog and mask files.
     dest : string
         Path to where you want output file.
     filt : string
@@ -51,41 +53,53 @@ def count_masked_pixels(orig='', dest='', filt=''):
     Outputs
     -------
     ascii file. `<filter>_mask_counts.dat`.
-    The number of masked pixels in each mask image.
+    The number of masked pixels and CRs in each image.
     """
     print orig
-    mask_list = glob.glob(os.path.join(orig, '*mask.fits'))
-    print mask_list
+    catalog_list = glob.glob(os.path.join(orig, '*crcat.fits'))
+    mask_list = [mask for mask in glob.glob(os.path.join(orig, '*mask.fits')) \
+                 if mask.replace('mask.fits', 'crcat.fits') not in catalog_list]
+    file_list = catalog_list + mask_list
+    print file_list
     
     mask_counts_list = []
+    cr_counts_list = []
     date_list = []
     
-    # Count masked pixels in each mask image.
+    # Read the counts from each catalog's header.
+    for catalog in catalog_list:
+        header = fits.getheader(catalog, 1)
+        mask_counts_list.append(header['NCRPIX'])
+        cr_counts_list.append(header['NCR'])
+        date_list.append(header['EXPSTART'])
+        print catalog, header['NCRPIX'], header['EXPSTART']
+
+    # Count masked pixels in each mask image without a catalog.
     for mask in mask_list:
         hdulist = fits.open(mask)
         header0 = hdulist[0].header
         data0 = hdulist[0].data
         
         date = header0['EXPSTART']
-        
-        mask_pixel_count = 0
-        for row in data0:
-            for pixel in row:
-                if pixel == 1:
-                    mask_pixel_count += 1
+        mask_pixel_count = int((data0 == 1).sum())
         
         hdulist.close()
         mask_counts_list.append(mask_pixel_count)
+        cr_counts_list.append(-1)
         date_list.append(date)
         print mask, mask_pixel_count, date
         
-    # Write masked pixel counts to file.
-    tt = {'#Filename':mask_list, 'Mask_Counts[pixels]':mask_counts_list, 'Date':date_list}
+    # Write masked pixel counts to file. CR counts are -1 where there
+    # was no catalog.
+    tt = {'#Filename':file_list, 'Mask_Counts[pixels]':mask_counts_list, \
+          'CR_Counts':cr_counts_list, 'Date':date_list}
     
     ascii.write(tt, dest + filt + '_mask_counts.dat', \
-                names=['#Filename', 'Mask_Counts[pixels]', 'Date'])
+                names=['#Filename', 'Mask_Counts[pixels]', 'CR_Counts', 'Date'])
 
     # Plot the pixel counts vs time.
+    # pylab is slow to import, so only load it when plotting.
+    import pylab
     pylab.ioff()
     fig=pylab.figure(figsize=(13.5,9.5))    
 
@@ -138,24 +152,30 @@ def parse_args():
 # The main.
 #-------------------------------------------------------------------------------#
 
-def main_count_masked_pixels():
-    """
+def main_count_masked_pixels(orig='', dest='', filt=None):
+    """Counts the masked pixels for one filter, or for every filter
+    directory in `orig` if no filter is given.
+
+    Parameters
+    ----------
+    orig : string
+        Path to filter dirs containing `*mask.fits` files.
+    dest : string
+        Path to where you want output files.
+    filt : string
+        Name of the filter dir to run over. If None, runs over all
+        `F*` dirs in `orig`.
     """
-    
-    args = parse_args()
-    
-    orig = args.orig
-    dest = args.dest
-    #filt = args.filt
-    
     if filt == None:
-        filters = glob.glob(orig + '/F*')
+        filters = [os.path.basename(filt_dir) for filt_dir in \
+                   glob.glob(os.path.join(orig, 'F*'))]
     else:
-        filters = list(filt)
-        
-    for filt in filters:    
-        count_masked_pixels(orig, dest, filt)
+        filters = [filt]
+
+    for filt in filters:
+        count_masked_pixels(os.path.join(orig, filt), dest, filt)
         
 if __name__ == '__main__':
 
-    main_count_masked_pixels()
\ No newline at end of file
+    args = parse_args()
+    main_count_masked_pixels(args.orig, args.dest, args.filt)
\ No newline at end of file
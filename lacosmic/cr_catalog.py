@@ -0,0 +1,139 @@
+"""
+Catalogs the cosmic rays of an image from its CR mask, while the
+image, mask and clean image are still in memory.
+
+Each CR is a connected group of masked pixels (8-connected, as the CRs
+are grown by the 3x3 kernel of ``lacos_im``). The catalog gives each
+CR's centroid, pixel area, flux removed (original minus clean), peak of
+the original and bounding box, and is written as a binary FITS table,
+``<file rootname>.crcat.fits``, next to the mask. Its header holds the
+total number of CRs and CR pixels, so counts need not open the masks.
+
+Author:
+
+    C.M. Gosmeyer
+"""
+
+import numpy as np
+from scipy import ndimage
+
+from lacosmic.lacos_engine import GROWTH_KERNEL
+
+# Columns of the catalog. Coordinates are zero-based NumPy indices.
+CATALOG_DTYPE = [('id', 'i4'),
+                 ('x', 'f4'),
+                 ('y', 'f4'),
+                 ('area', 'i4'),
+                 ('flux', 'f4'),
+                 ('peak', 'f4'),
+                 ('xmin', 'i2'),
+                 ('xmax', 'i2'),
+                 ('ymin', 'i2'),
+                 ('ymax', 'i2')]
+
+# Keywords copied from the image header to the catalog header.
+HEADER_KEYS = ['ROOTNAME', 'FILTER', 'EXPSTART', 'FLSHCORR']
+
+#-------------------------------------------------------------------------------#
+
+def catalog_name(filename):
+    """Name of the catalog of the FLT `filename`."""
+    return filename.split('.fits')[0] + '.crcat.fits'
+
+
+#-------------------------------------------------------------------------------#
+
+def cr_catalog(mask, image, clean):
+    """Labels the CRs in a mask and measures each one.
+
+    Parameters
+    ----------
+    mask : array of bools
+        True at CR pixels.
+    image : array
+        The original image.
+    clean : array
+        The cosmic ray cleaned image.
+
+    Returns
+    -------
+    catalog : structured array
+        One row per CR, with the columns of :data:`CATALOG_DTYPE`.
+        The centroid, `x` and `y`, is the mean position of the CR's
+        pixels.
+    """
+    labels, ncr = ndimage.label(mask, structure=GROWTH_KERNEL)
+    catalog = np.zeros(ncr, dtype=CATALOG_DTYPE)
+    if ncr == 0:
+        return catalog
+
+    # CR pixels, grouped by label. Within a label they stay in raster
+    # order, so each group's first and last pixels bound it in y.
+    index = np.flatnonzero(labels)
+    order = np.argsort(labels.flat[index], kind='mergesort')
+    index = index[order]
+    label = labels.flat[index] - 1
+    y, x = np.divmod(index, mask.shape[1])
+
+    area = np.bincount(label, minlength=ncr)
+    starts = np.concatenate(([0], np.cumsum(area)[:-1]))
+    values = np.asarray(image, dtype=np.float64).flat[index]
+    removed = values - np.asarray(clean, dtype=np.float64).flat[index]
+
+    catalog['id'] = np.arange(1, ncr + 1)
+    catalog['x'] = np.bincount(label, x, ncr) / area
+    catalog['y'] = np.bincount(label, y, ncr) / area
+    catalog['area'] = area
+    catalog['flux'] = np.bincount(label, removed, ncr)
+    catalog['peak'] = np.maximum.reduceat(values, starts)
+    catalog['xmin'] = np.minimum.reduceat(x, starts)
+    catalog['xmax'] = np.maximum.reduceat(x, starts)
+    catalog['ymin'] = y[starts]
+    catalog['ymax'] = y[starts + area - 1]
+    return catalog
+
+
+#-------------------------------------------------------------------------------#
+
+def write_catalog(filename, catalog, header):
+    """Writes the catalog of the FLT `filename` to
+    ``<file rootname>.crcat.fits``.
+
+    Parameters
+    ----------
+    filename : string
+        Name of the FLT, including the path.
+    catalog : structured array
+        Output of :func:`cr_catalog`.
+    header : astropy.io.fits.Header
+        Header of the image, for :data:`HEADER_KEYS`.
+    """
+    from astropy.io import fits
+
+    table = fits.BinTableHDU(catalog, name='CRCAT')
+    for key in HEADER_KEYS:
+        if key in header:
+            table.header[key] = header[key]
+    table.header['NCR'] = (len(catalog), 'Number of cosmic rays')
+    table.header['NCRPIX'] = (int(catalog['area'].sum()), \
+                              'Number of cosmic ray pixels')
+    fits.HDUList([fits.PrimaryHDU(), table]).writeto(catalog_name(filename), \
+                                                      overwrite=True)
+
+
+def catalog_from_files(filename):
+    """Catalogs the CRs of an FLT from its ``.clean.fits`` and
+    ``.mask.fits``, for engines that only write those (``IRAF``).
+
+    Parameters
+    ----------
+    filename : string
+        Name of the FLT, including the path.
+    """
+    from astropy.io import fits
+
+    rootname = filename.split('.fits')[0]
+    image = fits.getdata(filename, 1)
+    clean = fits.getdata(rootname + '.clean.fits', 0)
+    mask, header = fits.getdata(rootname + '.mask.fits', 0, header=True)
+    write_catalog(filename, cr_catalog(mask == 1, image, clean), header)
@@ -0,0 +1,125 @@
+"""
+On-disk cache of the threshold-independent intermediates of the
+Python ``LACosmic`` engine, :mod:`lacosmic.lacos_engine`.
+
+In each iteration, the significance map (the Laplacian divided by the
+noise model) and the fine structure image depend only on the image
+going into the iteration and on the noise model, not on `sigclip`,
+`sigfrac` or `objlim`. So when re-tuning those thresholds, the maps
+are read back from the cache and only the threshold comparisons are
+redone. The first iteration always hits. Later iterations hit as long
+as the CRs found so far are the same as in the cached run.
+
+Entries are keyed by a hash of the iteration's input image, the noise
+model and :data:`lacosmic.lacos_engine.ENGINE_VERSION`, and stored as
+``.npy`` files, which are read back memory-mapped. When the cache
+grows over its size cap, the least recently used entries are removed.
+
+Author:
+
+    C.M. Gosmeyer
+"""
+
+import hashlib
+import os
+import shutil
+
+import numpy as np
+
+from lacosmic.lacos_engine import ENGINE_VERSION
+
+# Default size cap of the cache, bytes.
+CACHE_MAX_BYTES = 2e9
+
+# Names of the cached maps, in the order the engine uses them.
+MAPS = ['sigmap', 'med3']
+
+#-------------------------------------------------------------------------------#
+
+class IntermediateCache(object):
+    """Cache of detection maps in the directory `cache_dir`.
+
+    Parameters
+    ----------
+    cache_dir : string
+        Path to the cache. Created if it does not exist.
+    max_bytes : float
+        Size cap of the cache, bytes.
+    """
+    def __init__(self, cache_dir, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def key(self, *inputs):
+        """Hashes the inputs of the detection maps: arrays by their
+        content, shape and type, anything else by its ``repr``.
+        """
+        sha = hashlib.sha1(ENGINE_VERSION.encode())
+        for item in inputs:
+            if isinstance(item, np.ndarray):
+                sha.update(repr((item.shape, item.dtype.str)).encode())
+                sha.update(np.ascontiguousarray(item).tobytes())
+            else:
+                sha.update(repr(item).encode())
+        return sha.hexdigest()
+
+    def get(self, key):
+        """Returns the memory-mapped maps of entry `key`, or None if
+        it is not cached.
+        """
+        entry = os.path.join(self.cache_dir, key)
+        try:
+            maps = [np.load(os.path.join(entry, name + '.npy'), mmap_mode='r') \
+                    for name in MAPS]
+            # Mark as recently used.
+            os.utime(entry, None)
+        except (IOError, OSError):
+            return None
+        return maps
+
+    def put(self, key, maps):
+        """Stores `maps` as entry `key`, then evicts the least recently
+        used entries until the cache is under its size cap.
+        """
+        entry = os.path.join(self.cache_dir, key)
+        if os.path.exists(entry):
+            return
+
+        # Write aside then rename, so readers never see a partial entry.
+        temp = os.path.join(self.cache_dir, '.' + key + '.' + str(os.getpid()))
+        os.makedirs(temp)
+        for name, array in zip(MAPS, maps):
+            np.save(os.path.join(temp, name + '.npy'), array)
+        try:
+            os.rename(temp, entry)
+        except OSError:
+            # Another process stored it first.
+            shutil.rmtree(temp, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is
+        under its size cap.
+        """
+        entries = []
+        total = 0
+        for key in os.listdir(self.cache_dir):
+            if key.startswith('.'):
+                continue
+            entry = os.path.join(self.cache_dir, key)
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, name + '.npy')) \
+                           for name in MAPS)
+                entries.append((os.path.getmtime(entry), size, entry))
+            except OSError:
+                continue
+            total += size
+
+        for mtime, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
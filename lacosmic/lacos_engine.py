@@ -0,0 +1,405 @@
+"""
+NumPy/SciPy port of the IRAF task ``lacos_im`` (``lacos_im.cl``), the
+Laplacian cosmic ray removal of van Dokkum (2001, PASP 113, 1420).
+
+Each step follows the IRAF script, with the same kernels, box sizes
+and ``nearest`` boundaries. :func:`lacos_im` adds three options:
+
+    * A noise map (see :mod:`lacosmic.noise_model`), used in every
+      iteration instead of rebuilding the noise model from a 5x5
+      median of the image each time.
+    * Known bad pixels (e.g., from the DQ extension), which are
+      neither detected as CRs nor used to clean them.
+    * An on-disk cache of the maps that do not depend on the
+      thresholds (see :mod:`lacosmic.lacos_cache`).
+
+The CRs are replaced by medians taken only at the masked pixels
+(:func:`masked_median_at`), instead of a median of the whole frame.
+The other medians are the same as SciPy's, but taken with sorting
+networks (see :mod:`lacosmic.median_network`).
+
+Author:
+
+    C.M. Gosmeyer
+"""
+
+import warnings
+
+import numpy as np
+from scipy import ndimage
+
+from lacosmic.median_network import median_filter
+
+ENGINE_VERSION = '1.0'
+
+# Laplacian kernel, convolved with the 2x2 subsampled image.
+LAPLACE_KERNEL = np.array([[0., -1., 0.],
+                           [-1., 4., -1.],
+                           [0., -1., 0.]])
+
+# Growth kernel, grows CRs by one pixel.
+GROWTH_KERNEL = np.ones((3, 3), dtype=bool)
+
+# Ways of taking the medians that replace the CRs.
+REPLACE_MODES = ['sparse', 'full']
+
+#-------------------------------------------------------------------------------#
+
+def median_noise(image, gain, readn):
+    """Creates the ``LACosmic`` noise model from a 5x5 median of the
+    image, which should exclude all CRs.
+
+    Parameters
+    ----------
+    image : array
+        The image, in ADU.
+    gain : float or array
+        Gain, electrons/ADU.
+    readn : float or array
+        Read noise, electrons.
+
+    Returns
+    -------
+    noise : array
+        One sigma noise of each pixel, in ADU.
+    """
+    med5 = median_filter(image, 5)
+    med5[med5 <= 0] = 0.0001
+    return np.sqrt(med5 * gain + readn**2) / gain
+
+
+#-------------------------------------------------------------------------------#
+
+def subsampled_laplacian(image):
+    """Takes the second-order derivative (Laplacian) of the image.
+    The kernel is convolved with the 2x2 subsampled image, in order to
+    remove the negative pattern around high pixels.
+
+    Parameters
+    ----------
+    image : array
+        The image.
+
+    Returns
+    -------
+    deriv2 : array
+        The Laplacian, block averaged back to the shape of `image`.
+    """
+    ny, nx = image.shape
+    blk = np.repeat(np.repeat(image, 2, axis=0), 2, axis=1)
+    lapla = ndimage.convolve(blk, LAPLACE_KERNEL, mode='nearest')
+    lapla[lapla < 0] = 0
+    return lapla.reshape(ny, 2, nx, 2).mean(axis=3).mean(axis=1)
+
+
+#-------------------------------------------------------------------------------#
+
+def significance_map(image, noise):
+    """Divides the Laplacian by the noise model and removes large
+    structure (bright, extended objects).
+
+    Parameters
+    ----------
+    image : array
+        The image.
+    noise : array
+        One sigma noise of each pixel.
+
+    Returns
+    -------
+    sigmap : array
+        Significance of the Laplacian of each pixel.
+    """
+    # Laplacian of blkreplicated image counts edges twice.
+    sigmap = subsampled_laplacian(image) / noise / 2.
+    sigmap -= median_filter(sigmap, 5)
+    return sigmap
+
+
+#-------------------------------------------------------------------------------#
+
+def fine_structure(image, noise):
+    """Subtracts the background and smooth component of objects,
+    leaving the fine structure against which the CR candidates are
+    compared.
+
+    Parameters
+    ----------
+    image : array
+        The image.
+    noise : array
+        One sigma noise of each pixel.
+
+    Returns
+    -------
+    med3 : array
+        The fine structure image, in units of the noise.
+    """
+    med3 = median_filter(image, 3)
+    med7 = median_filter(med3, 7)
+    med3 = (med3 - med7) / noise
+    med3[med3 <= 0.01] = 0.01
+    return med3
+
+
+#-------------------------------------------------------------------------------#
+
+def detection_maps(image, gain, readn, noise=None):
+    """Makes the maps of an iteration that do not depend on the
+    detection thresholds.
+
+    Parameters
+    ----------
+    image : array
+        The image going into the iteration.
+    gain : float
+        Gain, electrons/ADU. Not used if `noise` is given.
+    readn : float
+        Read noise, electrons. Not used if `noise` is given.
+    noise : array
+        One sigma noise of each pixel. If None, modeled from a 5x5
+        median of `image`.
+
+    Returns
+    -------
+    maps : list of arrays
+        [sigmap, med3], the outputs of :func:`significance_map` and
+        :func:`fine_structure`.
+    """
+    if noise is None:
+        noise = median_noise(image, gain, readn)
+    return [significance_map(image, noise), fine_structure(image, noise)]
+
+
+#-------------------------------------------------------------------------------#
+
+def select_cosmic_rays(sigmap, med3, sigclip, sigfrac, objlim, badpix=None):
+    """Finds the CR pixels from the significance and fine structure
+    maps.
+
+    Parameters
+    ----------
+    sigmap : array
+        Output of :func:`significance_map`.
+    med3 : array
+        Output of :func:`fine_structure`.
+    sigclip : float
+        Detection limit for cosmic rays.
+    sigfrac : float
+        Detection limit for adjacent pixels, as fraction of `sigclip`.
+    objlim : float
+        Contrast limit between CR and underlying object.
+    badpix : array of bools
+        True at known bad pixels, which are never selected, nor
+        grown from.
+
+    Returns
+    -------
+    finalsel : array of bools
+        True where a pixel is affected by a cosmic ray.
+    """
+    # Candidates, which include sharp features such as stars.
+    firstsel = sigmap > sigclip
+    if badpix is not None:
+        firstsel &= ~badpix
+
+    # Discard if CR flux <= objlim * object flux.
+    firstsel &= (sigmap / med3) > objlim
+
+    # Grow CRs by one pixel and check in original sigma map.
+    gfirstsel = ndimage.binary_dilation(firstsel, GROWTH_KERNEL)
+    gfirstsel &= sigmap > sigclip
+    if badpix is not None:
+        gfirstsel &= ~badpix
+
+    # Grow CRs by one pixel and lower detection limit.
+    finalsel = ndimage.binary_dilation(gfirstsel, GROWTH_KERNEL)
+    finalsel &= sigmap > sigfrac * sigclip
+    if badpix is not None:
+        finalsel &= ~badpix
+
+    return finalsel
+
+
+#-------------------------------------------------------------------------------#
+
+def masked_median(image, mask, size=5, rows=256):
+    """Median of the unmasked pixels in a `size` x `size` box around
+    every pixel. Pixels whose box is fully masked get 0.
+
+    Parameters
+    ----------
+    image : array
+        The image.
+    mask : array of bools
+        True where pixels are excluded.
+    size : int
+        Width of the box.
+    rows : int
+        Number of image rows to filter at a time, which bounds the
+        memory of the window stack.
+
+    Returns
+    -------
+    med : array
+        The masked median.
+    """
+    half = size // 2
+    padded = np.pad(np.where(mask, np.nan, image), half, mode='edge')
+    med = np.empty(image.shape, dtype=image.dtype)
+    for row in range(0, image.shape[0], rows):
+        block = padded[row:row + rows + 2 * half]
+        windows = np.lib.stride_tricks.as_strided(block, \
+            shape=(block.shape[0] - 2 * half, image.shape[1], size, size), \
+            strides=block.strides * 2)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            med[row:row + rows] = np.nanmedian( \
+                windows.reshape(windows.shape[:2] + (size * size,)), axis=2)
+    med[np.isnan(med)] = 0
+    return med
+
+
+def masked_median_at(image, mask, index, size=5, chunk=65536):
+    """Same as :func:`masked_median`, but only at the pixels `index`,
+    so the cost scales with the number of masked pixels rather than
+    with the frame. The values are identical to those of
+    :func:`masked_median` at those pixels.
+
+    Parameters
+    ----------
+    image : array
+        The image.
+    mask : array of bools
+        True where pixels are excluded.
+    index : tuple of arrays
+        (y, x) of the pixels, as from ``np.nonzero``.
+    size : int
+        Width of the box.
+    chunk : int
+        Number of pixels to take the median of at a time, which
+        bounds the memory of the window stack.
+
+    Returns
+    -------
+    med : array
+        The masked median at each pixel of `index`.
+    """
+    half = size // 2
+    ny, nx = image.shape
+    offsets = np.arange(-half, half + 1)
+    # Clipping the box to the frame repeats the edge pixels, as the
+    # 'edge' padding of masked_median does.
+    dy = np.repeat(offsets, size)
+    dx = np.tile(offsets, size)
+    med = np.empty(len(index[0]), dtype=image.dtype)
+    for start in range(0, len(med), chunk):
+        y = np.clip(index[0][start:start + chunk, None] + dy, 0, ny - 1)
+        x = np.clip(index[1][start:start + chunk, None] + dx, 0, nx - 1)
+        windows = np.where(mask[y, x], np.nan, image[y, x])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            med[start:start + chunk] = np.nanmedian(windows, axis=1)
+    med[np.isnan(med)] = 0
+    return med
+
+
+#-------------------------------------------------------------------------------#
+
+def lacos_im(image, gain=2.0, readn=6.0, skyval=0.0, sigclip=4.5, \
+             sigfrac=0.5, objlim=1.0, niter=4, noise=None, badpix=None, \
+             cache=None, replace='sparse'):
+    """Laplacian cosmic ray removal of a single image.
+
+    Parameters
+    ----------
+    image : array
+        The image.
+    gain : float
+        Gain, electrons/ADU. Not used if `noise` is given.
+    readn : float
+        Read noise, electrons. Not used if `noise` is given.
+    skyval : float
+        Sky level that has been subtracted, ADU.
+    sigclip : float
+        Detection limit for cosmic rays.
+    sigfrac : float
+        Fractional detection limit for neighbouring pixels.
+    objlim : float
+        Contrast limit between CR and underlying object.
+    niter : int
+        Maximum number of iterations.
+    noise : array
+        One sigma noise of each pixel, in the units of `image`. If
+        None, the noise is modeled from a 5x5 median of the image in
+        every iteration, as ``lacos_im.cl`` does.
+    badpix : array of bools
+        True at known bad pixels. These are excluded from the CR
+        search and from the medians that replace the CRs, and are
+        left as they are in the cleaned image.
+    cache : lacosmic.lacos_cache.IntermediateCache
+        If given, the maps of :func:`detection_maps` are read from
+        and stored in this cache.
+    replace : {'sparse', 'full'}
+        'sparse' by default, the 5x5 medians that replace the CRs are
+        taken only at the masked pixels. 'full' takes them over the
+        whole frame, as ``lacos_im.cl`` does. Both give identical
+        results.
+
+    Returns
+    -------
+    clean : array
+        The cosmic ray cleaned image.
+    mask : array of bools
+        True where a cosmic ray was found. Never True at `badpix`.
+    """
+    if noise is None and gain <= 0:
+        raise ValueError('gain must be positive.')
+    if replace not in REPLACE_MODES:
+        raise ValueError("replace must be one of " + str(REPLACE_MODES))
+
+    oldoutput = np.array(image, dtype=np.float32)
+    if skyval > 0:
+        oldoutput += skyval
+    mask = np.zeros(oldoutput.shape, dtype=bool)
+
+    for i in range(niter):
+        if cache is None:
+            sigmap, med3 = detection_maps(oldoutput, gain, readn, noise)
+        else:
+            key = cache.key(oldoutput, gain, readn, noise)
+            maps = cache.get(key)
+            if maps is None:
+                maps = detection_maps(oldoutput, gain, readn, noise)
+                cache.put(key, maps)
+            sigmap, med3 = maps
+
+        finalsel = select_cosmic_rays(sigmap, med3, sigclip, sigfrac, objlim, \
+                                      badpix=badpix)
+
+        # Number of CR pixels found in this iteration.
+        npix = np.count_nonzero(finalsel & ~mask)
+
+        # Create cleaned output; use 5x5 median with CRs and bad
+        # pixels excluded.
+        mask |= finalsel
+        if badpix is None:
+            excluded = mask
+        else:
+            excluded = mask | badpix
+        if replace == 'full':
+            med5 = masked_median(oldoutput, excluded)
+            oldoutput = np.where(mask, med5, oldoutput)
+        else:
+            # The masked pixels are excluded from every median, so
+            # replacing them in place does not change the others.
+            index = np.nonzero(mask)
+            oldoutput[index] = masked_median_at(oldoutput, excluded, index)
+
+        if npix == 0:
+            break
+
+    if skyval > 0:
+        oldoutput -= skyval
+
+    return oldoutput, mask
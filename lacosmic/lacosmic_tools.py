@@ -6,12 +6,11 @@ Author:
     C.M. Gosmeyer
 """
 
+import errno
 import glob
 import os
 import shutil
 
-from astropy.io import fits
-
 #-------------------------------------------------------------------------------# 
 
 def get_keyval(filename='', keyword='', ext=0):
@@ -38,6 +37,8 @@ def get_keyval(filename='', keyword='', ext=0):
     This assumes all the FITS in the directory are of the same filter.
 
     """
+    from astropy.io import fits
+
     if filename != '' or filename[len(filename)-4:] == 'fits':  ## how slice just the last few?
         fits_file = fits.open(filename)
     else:
@@ -55,6 +56,23 @@ def get_keyval(filename='', keyword='', ext=0):
 
 #-------------------------------------------------------------------------------# 
 
+def make_dir(path):
+    """Makes the directory `path`, unless it exists. Safe when
+    several processes make it at once.
+
+    Parameters
+    ----------
+    path : string
+        The directory.
+    """
+    try:
+        os.makedirs(path)
+    except OSError as err:
+        if err.errno != errno.EEXIST:
+            raise
+
+#-------------------------------------------------------------------------------# 
+
 def move_files(glob_search, destination_dir):
     """Moves files with 'glob_search' commonality to the directory
     'destination_dir'.
@@ -90,14 +108,43 @@ def move_files(glob_search, destination_dir):
             if len(destination_dir) > 1 and i >= 1:
                 appended_destination_dir = destination_dir[i-1] + '/' + \
 			        destination_dir[i] #(destination_dir[i]).split('/')[len(destination_dir)-1]
-                if not os.path.exists(appended_destination_dir):
-                    os.makedirs(appended_destination_dir)
+                make_dir(appended_destination_dir)
                 for file in file_list:
                     shutil.move(str(file), appended_destination_dir)
 	                
             # If lists singletons:
             else:
-                if not os.path.exists(destination_dir[i]):
-                    os.makedirs(destination_dir[i])
+                make_dir(destination_dir[i])
                 for file in file_list:
-                    shutil.move(str(file), destination_dir[i])
\ No newline at end of file
+                    shutil.move(str(file), destination_dir[i])
+
+
+#-------------------------------------------------------------------------------# 
+
+def inherit_header(header0, header_ext):
+    """Merges the primary header into the header of an extension, the
+    way ``IRAF`` does when it copies an extension to a new image.
+
+    Parameters
+    ----------
+    header0 : astropy.io.fits.Header
+        Primary header.
+    header_ext : astropy.io.fits.Header
+        Header of the extension. Its cards override the primary's.
+
+    Returns
+    -------
+    header : astropy.io.fits.Header
+        Header for a new primary HDU, without the structural keywords.
+    """
+    from astropy.io import fits
+
+    structural = ['SIMPLE', 'XTENSION', 'BITPIX', 'NAXIS', 'NAXIS1', \
+                  'NAXIS2', 'EXTEND', 'PCOUNT', 'GCOUNT', 'NEXTEND']
+
+    header = fits.Header([card for card in header0.cards \
+                          if card.keyword not in structural])
+    header.extend([card for card in header_ext.cards \
+                   if card.keyword not in structural], update=True)
+
+    return header
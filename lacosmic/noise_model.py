@@ -0,0 +1,174 @@
+"""
+Noise models for the Python ``LACosmic`` engine,
+:mod:`lacosmic.lacos_engine`.
+
+Each model is built once per image, so the engine does not rebuild its
+noise model from a 5x5 median of the image on every iteration.
+
+    'median' : No noise map. The engine models the noise from a 5x5
+               median of the image each iteration, as ``lacos_im.cl``.
+    'err'    : The calibrated ERR extension of the FLT.
+    'header' : A 5x5 median of the image with the gain and read noise
+               of each amplifier quadrant, from the header keywords
+               ``ATODGN<amp>`` and ``READNSE<amp>``.
+
+Author:
+
+    C.M. Gosmeyer
+"""
+
+import numpy as np
+
+from lacosmic.median_network import median_filter
+
+NOISE_MODELS = ['median', 'err', 'header']
+
+# Amplifiers of each WFC3/UVIS chip, (left, right).
+CHIP_AMPS = {1:('A', 'B'), 2:('C', 'D')}
+
+# First column of the right amplifier in a trimmed chip.
+AMP_SPLIT = 2048
+
+#-------------------------------------------------------------------------------#
+
+def amp_columns(header0, header_sci, nx):
+    """Finds the amplifier that read each column of a SCI extension.
+
+    Parameters
+    ----------
+    header0 : astropy.io.fits.Header
+        Primary header of the FLT.
+    header_sci : astropy.io.fits.Header
+        Header of the SCI extension.
+    nx : int
+        Number of columns in the SCI extension.
+
+    Returns
+    -------
+    amps : array of strings
+        Amplifier letter of each column.
+
+    Notes
+    -----
+    Subarrays read by a single amplifier (``CCDAMP`` of one letter)
+    use it for all columns. Otherwise, columns are placed on the chip
+    using ``LTV1`` and split at :data:`AMP_SPLIT`.
+    """
+    ccdamp = str(header0.get('CCDAMP', '')).strip()
+    if len(ccdamp) == 1:
+        return np.array([ccdamp] * nx)
+
+    left, right = CHIP_AMPS.get(header_sci.get('CCDCHIP', 1), CHIP_AMPS[1])
+    x_chip = np.arange(nx) - header_sci.get('LTV1', 0.0)
+    return np.where(x_chip < AMP_SPLIT, left, right)
+
+
+#-------------------------------------------------------------------------------#
+
+def header_noise(image, header0, header_sci, gain, readn):
+    """Builds the noise map from a 5x5 median of the image and the
+    gain and read noise of each amplifier quadrant.
+
+    Parameters
+    ----------
+    image : array
+        The SCI data.
+    header0 : astropy.io.fits.Header
+        Primary header of the FLT.
+    header_sci : astropy.io.fits.Header
+        Header of the SCI extension.
+    gain : float
+        Gain to use if an amplifier has no ``ATODGN`` keyword.
+    readn : float
+        Read noise to use if an amplifier has no ``READNSE`` keyword.
+
+    Returns
+    -------
+    noise : array
+        One sigma noise of each pixel, in the units of `image`.
+
+    Notes
+    -----
+    If ``BUNIT`` is ELECTRONS, as in UVIS FLTs, the data are already
+    gain corrected, so only the read noise is taken from the header.
+    """
+    amps = amp_columns(header0, header_sci, image.shape[1])
+    amp_gain = np.ones(image.shape[1])
+    amp_readn = np.ones(image.shape[1])
+    for amp in set(amps):
+        amp_gain[amps == amp] = header0.get('ATODGN' + amp, gain)
+        amp_readn[amps == amp] = header0.get('READNSE' + amp, readn)
+
+    if str(header_sci.get('BUNIT', '')).strip().upper() == 'ELECTRONS':
+        amp_gain[:] = 1.0
+
+    med5 = median_filter(image.astype(np.float32), 5)
+    med5[med5 <= 0] = 0.0001
+    return np.sqrt(med5 * amp_gain + amp_readn**2) / amp_gain
+
+
+#-------------------------------------------------------------------------------#
+
+def err_noise(err):
+    """Builds the noise map from the ERR extension.
+
+    Parameters
+    ----------
+    err : array
+        The ERR data.
+
+    Returns
+    -------
+    noise : array
+        One sigma noise of each pixel.
+
+    Notes
+    -----
+    ERR includes the Poisson noise of the cosmic rays themselves, which
+    would hide them in the significance map. So, like ``lacos_im.cl``,
+    a 5x5 median is taken, but once instead of every iteration.
+    Pixels with no valid ERR are given the median ERR.
+    """
+    err = np.array(err, dtype=np.float32)
+    with np.errstate(invalid='ignore'):
+        bad = ~np.isfinite(err) | (err <= 0)
+    if bad.all():
+        raise ValueError('ERR extension has no valid pixels.')
+    err[bad] = np.median(err[~bad])
+    return median_filter(err, 5)
+
+
+#-------------------------------------------------------------------------------#
+
+def make_noise_map(noise_model, hdulist, ext, gain, readn):
+    """Builds the noise map of a SCI extension.
+
+    Parameters
+    ----------
+    noise_model : string
+        One of :data:`NOISE_MODELS`.
+    hdulist : astropy.io.fits.HDUList
+        The open FLT.
+    ext : int
+        Number of the SCI extension. The ERR extension of the same
+        ``EXTVER`` is used.
+    gain : float
+        Default gain, electrons/ADU.
+    readn : float
+        Default read noise, electrons.
+
+    Returns
+    -------
+    noise : array or None
+        One sigma noise of each pixel, or None for the 'median' model.
+    """
+    if noise_model == 'median':
+        return None
+    elif noise_model == 'err':
+        extver = hdulist[ext].header.get('EXTVER', 1)
+        return err_noise(hdulist['ERR', extver].data)
+    elif noise_model == 'header':
+        return header_noise(hdulist[ext].data, hdulist[0].header, \
+                            hdulist[ext].header, gain, readn)
+    else:
+        raise ValueError("noise_model must be one of " + str(NOISE_MODELS))
@@ -0,0 +1,182 @@
+"""
+Runs a batch as a pipeline of read, compute and write stages, so the
+reads and writes of a network filesystem overlap with the computation
+instead of leaving the CPU waiting on them.
+
+A prefetch thread reads the next `prefetch` items ahead of the
+computation, and a pool of `write_threads` threads writes the products
+of finished items while the next one is computed. Both queues are
+bounded, so at most ``prefetch + 2 + 2 * write_threads`` items are
+held in memory at once: one being read, `prefetch` read ahead, one
+being computed, and up to `write_threads` waiting to be written and
+as many being written. An error in any stage stops the pipeline, and
+the error of the earliest item that failed is raised, with the
+traceback of the stage that failed.
+
+Author:
+
+    C.M. Gosmeyer
+"""
+
+import threading
+import traceback
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+# Marks the end of a queue.
+DONE = None
+
+#-------------------------------------------------------------------------------#
+
+class PipelineError(RuntimeError):
+    """Raised when a stage of the pipeline failed.
+
+    Parameters
+    ----------
+    stage : string
+        'read', 'compute' or 'write'.
+    item : object
+        The item being processed.
+    message : string
+        Traceback of the error.
+    """
+    def __init__(self, stage, item, message):
+        RuntimeError.__init__(self, 'Failed to ' + stage + ' ' + str(item) + \
+                              ':\n' + message)
+        self.stage = stage
+        self.item = item
+
+
+#-------------------------------------------------------------------------------#
+
+def read_ahead(items, read, read_queue, stop):
+    """Puts (index, item, read(item), None) on `read_queue` for each
+    item, or (index, item, None, traceback) and stops at the first
+    error.
+    """
+    for index, item in enumerate(items):
+        if stop.is_set():
+            break
+        try:
+            read_queue.put((index, item, read(item), None))
+        except Exception:
+            read_queue.put((index, item, None, traceback.format_exc()))
+            break
+    read_queue.put(DONE)
+
+
+def write_behind(write, write_queue, errors):
+    """Calls write(item, products) for each (index, item, products)
+    on `write_queue`, appending (index, PipelineError) to `errors` when
+    one raises. After an error, the rest are skipped.
+    """
+    while True:
+        job = write_queue.get()
+        if job is DONE:
+            return
+        if errors:
+            continue
+        index, item, products = job
+        try:
+            write(item, products)
+        except Exception:
+            errors.append((index, PipelineError('write', item, \
+                                                traceback.format_exc())))
+
+
+#-------------------------------------------------------------------------------#
+
+def run_pipelined(items, read, compute, write, prefetch=2, write_threads=2):
+    """Runs read, compute and write over each item, overlapping the
+    reads and writes with the computation.
+
+    Parameters
+    ----------
+    items : list
+        The items, e.g., filenames.
+    read : function
+        read(item) returns what compute needs. Runs in the prefetch
+        thread.
+    compute : function
+        compute(item, data) returns the products. Runs in the calling
+        thread, in the order of `items`.
+    write : function
+        write(item, products) writes the products. Runs in the write
+        threads, so must be safe to call on several items at once.
+    prefetch : int
+        Most items read ahead of the computation.
+    write_threads : int
+        Number of write threads, which is also the most products
+        waiting to be written.
+
+    Returns
+    -------
+    nothing
+
+    Raises
+    ------
+    PipelineError
+        Of the earliest item that failed in any stage, after the items
+        already being written have finished. The errors of any later
+        items are printed.
+    """
+    stop = threading.Event()
+    read_queue = Queue(maxsize=max(prefetch, 1))
+    write_queue = Queue(maxsize=max(write_threads, 1))
+    write_errors = []
+
+    reader = threading.Thread(target=read_ahead, \
+                              args=(items, read, read_queue, stop))
+    reader.daemon = True
+    reader.start()
+    writers = [threading.Thread(target=write_behind, \
+                                args=(write, write_queue, write_errors)) \
+               for i in range(max(write_threads, 1))]
+    for writer in writers:
+        writer.daemon = True
+        writer.start()
+
+    errors = []
+    while True:
+        job = read_queue.get()
+        if job is DONE:
+            break
+        index, item, data, message = job
+        if message is not None:
+            errors.append((index, PipelineError('read', item, message)))
+            break
+        if write_errors:
+            break
+        try:
+            products = compute(item, data)
+        except Exception:
+            errors.append((index, PipelineError('compute', item, \
+                                                traceback.format_exc())))
+            break
+        # Drop the inputs before blocking on a full write queue.
+        del data
+        write_queue.put((index, item, products))
+        del products
+
+    # Stop the reader, unblocking it if its queue is full.
+    stop.set()
+    while reader.is_alive():
+        while not read_queue.empty():
+            read_queue.get()
+        reader.join(0.1)
+
+    # Let the writers finish what they have.
+    for writer in writers:
+        write_queue.put(DONE)
+    for writer in writers:
+        writer.join()
+
+    errors = [error for index, error in sorted(errors + write_errors, \
+                                               key=lambda error: error[0])]
+    for later in errors[1:]:
+        print(str(later))
+    if errors:
+        raise errors[0]
@@ -0,0 +1,286 @@
+"""
+Builds a review atlas of a batch: contact sheets of the original, mask
+and clean images of every FLT, with a static HTML index, instead of one
+``pylab`` PNG per FLT.
+
+Each FLT is one row of six tiles, laid out like the panels of
+:func:`lacosmic.run_lacosmic.create_images_png`: the full original,
+mask and clean images, downsampled, then their cuts around the center.
+Images are log scaled as in the diagnostic PNGs. In the mask, CRs are
+white and DQ flagged pixels grey. Rows are sorted so the FLTs most
+likely to have "blown up" come first, and written many rows to a sheet
+with NumPy only.
+
+Author:
+
+    C.M. Gosmeyer
+
+Use:
+
+    >>> lacosmic atlas --origin ./ --dest ./
+
+Outputs:
+
+    ``review_atlas/sheet_<n>.png`` and ``review_atlas/index.html``.
+"""
+
+import glob
+import os
+import struct
+import zlib
+
+import numpy as np
+
+# Width of each tile, pixels.
+TILE = 128
+
+# Blank pixels between tiles.
+GAP = 4
+
+# Cut around the source, as in the diagnostic PNGs.
+CUT = (slice(175, 275), slice(175, 275))
+
+# Scale limits of the original and clean images, as in the PNGs.
+SCALE_MIN = 3
+SCALE_MAX = 7000
+
+SORT_KEYS = ['masked_fraction', 'center_fraction', 'filename']
+
+#-------------------------------------------------------------------------------#
+
+def log_scale(image, scale_min=SCALE_MIN, scale_max=SCALE_MAX):
+    """Log scales an image between `scale_min` and `scale_max` into
+    8-bit grey levels, as ``img_scale.log`` does into 0 to 1.
+    """
+    image = np.clip(np.nan_to_num(image), scale_min, scale_max)
+    scaled = np.log10(np.maximum(image - scale_min, 1e-10)) / \
+        np.log10(scale_max - scale_min)
+    return (255 * np.clip(scaled, 0, 1)).astype(np.uint8)
+
+
+def mask_levels(mask):
+    """Grey levels of a mask: CRs white, DQ flagged pixels grey."""
+    levels = np.zeros(mask.shape, dtype=np.uint8)
+    levels[mask == 2] = 128
+    levels[mask == 1] = 255
+    return levels
+
+
+def downsample(image, size=TILE, reduce=np.max):
+    """Block reduces an image to fit in `size` x `size`, with `reduce`
+    over each block. Max keeps single CR pixels visible.
+    """
+    factor = int(np.ceil(max(image.shape) / float(size)))
+    if factor <= 1:
+        return image
+    ny = int(np.ceil(image.shape[0] / float(factor))) * factor
+    nx = int(np.ceil(image.shape[1] / float(factor))) * factor
+    padded = np.zeros((ny, nx), dtype=image.dtype)
+    padded[:image.shape[0], :image.shape[1]] = image
+    blocks = padded.reshape(ny // factor, factor, nx // factor, factor)
+    return reduce(reduce(blocks, axis=3), axis=1)
+
+
+def place(tile, size=TILE):
+    """Centers an image of at most `size` x `size` on a blank tile."""
+    out = np.zeros((size, size), dtype=np.uint8)
+    tile = tile[:size, :size]
+    y0 = (size - tile.shape[0]) // 2
+    x0 = (size - tile.shape[1]) // 2
+    out[y0:y0 + tile.shape[0], x0:x0 + tile.shape[1]] = tile
+    return out
+
+
+#-------------------------------------------------------------------------------#
+
+def write_png(filename, image):
+    """Writes an 8-bit greyscale image as a PNG, without ``pylab``.
+
+    Parameters
+    ----------
+    filename : string
+        Name of the PNG.
+    image : array of uint8
+        The image.
+    """
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + \
+            struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    ny, nx = image.shape
+    # Each row starts with filter type 0 (none).
+    raw = np.zeros((ny, nx + 1), dtype=np.uint8)
+    raw[:, 1:] = image
+    with open(filename, 'wb') as png:
+        png.write(b'\x89PNG\r\n\x1a\n')
+        png.write(chunk(b'IHDR', struct.pack('>IIBBBBB', nx, ny, 8, 0, 0, 0, 0)))
+        png.write(chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)))
+        png.write(chunk(b'IEND', b''))
+
+
+#-------------------------------------------------------------------------------#
+
+def find_output(filename, kind, output_dir):
+    """Finds the ``<rootname>.<kind>.fits`` of an FLT, in `output_dir`
+    or, if not yet sorted, next to the FLT.
+    """
+    rootname = os.path.basename(filename).split('.fits')[0]
+    for path in [os.path.join(output_dir, rootname + '.' + kind + '.fits'), \
+                 filename.split('.fits')[0] + '.' + kind + '.fits']:
+        if os.path.exists(path):
+            return path
+    raise IOError('No ' + kind + ' image found for ' + filename)
+
+
+def review_row(filename, clean_dir, mask_dir):
+    """Reads the original, mask and clean images of an FLT, and makes
+    its row of tiles and statistics.
+
+    Returns
+    -------
+    row : array of uint8
+        The six tiles, side by side.
+    stats : dictionary
+        'filename', 'masked_fraction' (of all pixels) and
+        'center_fraction' (of the cut) of the CR pixels.
+    """
+    from astropy.io import fits
+
+    orig = fits.getdata(filename, 1)
+    mask = fits.getdata(find_output(filename, 'mask', mask_dir), 0)
+    clean = fits.getdata(find_output(filename, 'clean', clean_dir), 0)
+
+    crs = mask == 1
+    stats = {'filename':os.path.basename(filename),
+             'masked_fraction':crs.mean(),
+             'center_fraction':crs[CUT].mean() if crs[CUT].size else 0.}
+
+    tiles = [log_scale(downsample(orig)),
+             downsample(mask_levels(mask)),
+             log_scale(downsample(clean)),
+             log_scale(orig[CUT]),
+             mask_levels(mask[CUT]),
+             log_scale(clean[CUT])]
+
+    row = np.zeros((TILE, 6 * TILE + 5 * GAP), dtype=np.uint8)
+    for i, tile in enumerate(tiles):
+        row[:, i * (TILE + GAP):i * (TILE + GAP) + TILE] = place(tile)
+    return row, stats
+
+
+#-------------------------------------------------------------------------------#
+
+def write_index(outdir, sheets, sort_by, missing=[]):
+    """Writes ``index.html``, with each sheet next to the names and
+    statistics of its rows, and the FLTs in `missing` listed at the
+    end.
+    """
+    html = ['<html><head><title>LACosmic review atlas</title>',
+            '<style>',
+            'body {font-family: monospace;}',
+            '.sheet {display: flex; margin-bottom: 20px;}',
+            'td {height: ' + str(TILE + GAP - 2) + 'px; padding: 0 8px; ' + \
+            'white-space: nowrap;}',
+            'table {border-collapse: collapse;}',
+            '</style></head><body>',
+            '<h1>LACosmic review atlas</h1>',
+            '<p>' + str(sum(len(rows) for name, rows in sheets)) + \
+            ' images, sorted by ' + sort_by + '. Columns: original, mask, ' + \
+            'clean, then the cuts of each around the center.</p>']
+    for name, rows in sheets:
+        html.append('<div class="sheet"><img src="' + name + \
+                    '" style="image-rendering: pixelated;"><table>')
+        for stats in rows:
+            html.append('<tr><td>' + stats['filename'] + '</td>' + \
+                        '<td>masked {0:.4%}</td><td>center {1:.4%}</td></tr>' \
+                        .format(stats['masked_fraction'], \
+                                stats['center_fraction']))
+        html.append('</table></div>')
+    if missing:
+        html.append('<h2>' + str(len(missing)) + \
+                    ' images without a clean or mask</h2><ul>')
+        for filename in missing:
+            html.append('<li>' + filename + '</li>')
+        html.append('</ul>')
+    html.append('</body></html>')
+
+    with open(os.path.join(outdir, 'index.html'), 'w') as index:
+        index.write('\n'.join(html) + '\n')
+
+
+#-------------------------------------------------------------------------------#
+
+def create_review_atlas(fits_list, clean_dir='flt_cleans', \
+                        mask_dir='flt_masks', outdir='review_atlas', \
+                        sort_by='masked_fraction', rows_per_sheet=50):
+    """Creates the contact sheets and HTML index of a batch.
+
+    Parameters
+    ----------
+    fits_list : list of strings
+        The original FLTs.
+    clean_dir : string
+        Directory of the ``.clean.fits`` files.
+    mask_dir : string
+        Directory of the ``.mask.fits`` files.
+    outdir : string
+        Directory to write the sheets and index to.
+    sort_by : {'masked_fraction', 'center_fraction', 'filename'}
+        Order of the rows. The fractions sort highest first, so the
+        over-flagged images (background, or the star's center) come
+        first.
+    rows_per_sheet : int
+        Number of FLTs on each sheet.
+
+    Outputs
+    -------
+    ``<outdir>/sheet_<n>.png`` and ``<outdir>/index.html``.
+    FLTs without a clean or mask image (e.g., failed jobs) are left
+    out of the sheets and listed at the end of the index.
+    """
+    if sort_by not in SORT_KEYS:
+        raise ValueError("sort_by must be one of " + str(SORT_KEYS))
+    if not os.path.exists(outdir):
+        os.makedirs(outdir)
+
+    rows = []
+    missing = []
+    for filename in fits_list:
+        try:
+            rows.append(review_row(filename, clean_dir, mask_dir))
+        except IOError as err:
+            print(str(err) + '; skipping it.')
+            missing.append(os.path.basename(filename))
+    rows.sort(key=lambda row: row[1][sort_by], \
+              reverse=(sort_by != 'filename'))
+
+    sheets = []
+    for start in range(0, len(rows), rows_per_sheet):
+        sheet_rows = rows[start:start + rows_per_sheet]
+        sheet = np.zeros((len(sheet_rows) * (TILE + GAP) - GAP, \
+                          sheet_rows[0][0].shape[1]), dtype=np.uint8)
+        for i, (row, stats) in enumerate(sheet_rows):
+            sheet[i * (TILE + GAP):i * (TILE + GAP) + TILE] = row
+
+        name = 'sheet_{0:03d}.png'.format(len(sheets))
+        write_png(os.path.join(outdir, name), sheet)
+        sheets.append((name, [stats for (row, stats) in sheet_rows]))
+
+    write_index(outdir, sheets, sort_by, missing)
+
+
+#-------------------------------------------------------------------------------#
+
+def main_review_atlas(origin='', dest='', sort_by='masked_fraction', \
+                      rows_per_sheet=50):
+    """Creates the review atlas of the FLTs in `origin`, whose outputs
+    were sorted into the directories in `dest`.
+    """
+    fits_list = sorted(glob.glob(origin + '*fl*.fits'))
+    fits_list = [filename for filename in fits_list \
+                 if '.clean.fits' not in filename and \
+                 '.mask.fits' not in filename]
+    create_review_atlas(fits_list, clean_dir=dest + 'flt_cleans', \
+                        mask_dir=dest + 'flt_masks', \
+                        outdir=dest + 'review_atlas', sort_by=sort_by, \
+                        rows_per_sheet=rows_per_sheet)
@@ -51,20 +51,26 @@ Notes:
 """
 
 import glob
-import numpy as np
 import os
-import pylab
-import shutil
-import sys
 
-from astropy.io import fits
-from pyraf import iraf
-
-import img_scale
-from set_paths import set_paths
 from lacosmic.lacosmic_tools import get_keyval
+from lacosmic.lacosmic_tools import inherit_header
 from lacosmic.lacosmic_tools import move_files
 
+# Gain (electrons/ADU) and read noise (electrons) given to LACosmic.
+GAIN = 1.5
+READN = 3.0
+
+ENGINES = ['iraf', 'python']
+
+# WFC3/UVIS DQ flags of known bad pixels: bad detector pixel (4),
+# hot pixel (16), bad column (128), full-well saturation (256) and
+# A-to-D saturation (2048).
+DQ_BITS = 4 | 16 | 128 | 256 | 2048
+
+# Mask value of pixels flagged in the DQ. CRs are 1.
+DQ_MASK_VALUE = 2
+
 #-------------------------------------------------------------------------------#
 
 def create_images_png(filename, outfilename='Default'):
@@ -87,11 +93,19 @@ def create_images_png(filename, outfilename='Default'):
         PNG file. ``<file rootname>.png`` by default.
         Shows both full frame images and "cut" images of the source.
     """
-    pylab.ioff()
+    # Plotting backends are slow to import, so only load them here.
+    # Draw on an Agg canvas of our own rather than through pylab, so
+    # that PNGs can be made from any thread, whatever the backend.
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    import img_scale
+    from astropy.io import fits
+
     # create page for plots
     page_width = 21.59/2
     page_height = 27.94/2
-    fig = pylab.figure(figsize=(page_width, page_height))
+    fig = Figure(figsize=(page_width, page_height))
+    canvas = FigureCanvasAgg(fig)
 
     file_clean = (filename.split('.fits')[0]+'.clean.fits')
     file_mask = (filename.split('.fits')[0]+'.mask.fits')
@@ -100,64 +114,63 @@ def create_images_png(filename, outfilename='Default'):
     scmin = 3 # scale_min for raw and clean
 
     # Plot the original image
-    pylab.subplot(3,2,1, aspect='equal') # 311
+    ax = fig.add_subplot(3,2,1, aspect='equal') # 311
     image_orig = fits.open(filename)
     image_orig_ext = image_orig[1].data
     image_orig_scaled = img_scale.log(image_orig_ext, \
                                       scale_min=scmin, \
                                       scale_max=scmax)
-    plt_orig = pylab.imshow(image_orig_scaled, aspect='equal')
-    pylab.title('Original (SCI)')
+    plt_orig = ax.imshow(image_orig_scaled, aspect='equal')
+    ax.set_title('Original (SCI)')
 
     # Plot cut of original image
-    pylab.subplot(3,2,2, aspect='equal')
+    ax = fig.add_subplot(3,2,2, aspect='equal')
     image_orig_cut = img_scale.log(image_orig_ext[175:275,175:275], \
                                    scale_min=scmin, \
                                    scale_max=scmax)
-    plt_orig_cut = pylab.imshow(image_orig_cut, aspect='equal')
-    pylab.title('Original (SCI)')
+    plt_orig_cut = ax.imshow(image_orig_cut, aspect='equal')
+    ax.set_title('Original (SCI)')
     image_orig.close()
 
 
     # Plot the mask image
-    pylab.subplot(3,2,3) #312
+    ax = fig.add_subplot(3,2,3) #312
     image_mask = fits.open(file_mask)
     image_mask_ext = image_mask[0].data
-    plt_orig = pylab.imshow(image_mask_ext, aspect='equal', vmin=-2, vmax=1) #-2, -5
-    pylab.title('Mask')
+    plt_orig = ax.imshow(image_mask_ext, aspect='equal', vmin=-2, \
+                         vmax=DQ_MASK_VALUE) #-2, -5
+    ax.set_title('Mask')
 
     # Plot cut of the mask image
-    pylab.subplot(3,2,4)
-    plt_mask_cut = pylab.imshow(image_mask_ext[175:275,175:275], \
-                                aspect='equal', vmin=-2, vmax=1)
-    pylab.title('Mask')
+    ax = fig.add_subplot(3,2,4)
+    plt_mask_cut = ax.imshow(image_mask_ext[175:275,175:275], \
+                             aspect='equal', vmin=-2, vmax=DQ_MASK_VALUE)
+    ax.set_title('Mask')
     image_mask.close()
 
 
     # Plot the LACosmic-cleaned image
-    pylab.subplot(3,2,5) #313
+    ax = fig.add_subplot(3,2,5) #313
     image_clean = fits.open(file_clean)
     image_clean_ext = image_clean[0].data
     image_clean_scaled = img_scale.log(image_clean_ext, \
                                        scale_min=scmin, \
                                        scale_max=scmax)
-    plt_clean = pylab.imshow(image_clean_scaled, aspect='equal')
-    pylab.title('Clean')
+    plt_clean = ax.imshow(image_clean_scaled, aspect='equal')
+    ax.set_title('Clean')
 
     #Plot cut of the LACosmic-cleaned image
-    pylab.subplot(3,2,6)
+    ax = fig.add_subplot(3,2,6)
     image_clean_cut = img_scale.log(image_clean_ext[175:275,175:275], \
                                     scale_min=scmin, scale_max=scmax)
-    plt_clean_cut = pylab.imshow(image_clean_cut, aspect='equal')
-    pylab.title('Clean')
+    plt_clean_cut = ax.imshow(image_clean_cut, aspect='equal')
+    ax.set_title('Clean')
     image_clean.close()
 
     if outfilename == 'Default':
-        pylab.savefig(filename.split('.fits')[0] + '.png')
+        canvas.print_figure(filename.split('.fits')[0] + '.png')
     else:
-        pylab.savefig(outfilename)
-    pylab.close()
-    pylab.ion()
+        canvas.print_figure(outfilename)
 
 
 #-------------------------------------------------------------------------------#
@@ -179,6 +192,8 @@ def define_lacosmic(path_to_lacos_im=''):
         
         task lacos_im = /path/lacos_im.cl
     """
+    from pyraf import iraf
+
     iraf.stsdas()
     iraf.task(lacos_im = path_to_lacos_im+'lacos_im.cl')
 
@@ -246,12 +261,52 @@ def lacosmic_param_dictionary():
     return param_dict
 
 
+#-------------------------------------------------------------------------------#
+
+def lacosmic_params(filt, param_dict=None):
+    """Returns the LACosmic parameters for the given filter, or
+    default values if the filter is not in the parameter dictionary.
+
+    Parameters:
+        filt : string
+            Name of the filter.
+        param_dict : dictionary, optional
+            Output of :func:`lacosmic_param_dictionary`. Read if not
+            given.
+
+    Returns:
+        params : list
+            [sigclip, sigfrac, objlim, niter, sigclip_pf]
+
+    Outputs:
+        nothing
+    """
+    if param_dict is None:
+        param_dict = lacosmic_param_dictionary()
+
+    if filt not in param_dict.keys():
+        print "Filter not in Param Dictionary. Using default values."
+        if 'N' in filt:
+            sigclip = 4.5
+            objlim = 5
+        else:
+            sigclip = 5.0
+            objlim = 2
+        sigfrac = 0.3
+        niter = 3
+        sigclip_pf = 9.5
+        return [sigclip, sigfrac, objlim, niter, sigclip_pf]
+
+    return param_dict[filt]
+
+
 #-------------------------------------------------------------------------------#
 
 def sort_files(origin='', dest='', keep_masks = True, \
                temp_folder=False):
     """Moves clean and mask FITS images and their PNGs into their own
     subdirectories, `flt_cleans`., `flt_masks`, and `png_masks_cleans`.
+    The CR catalogs go with the masks.
 
     Parameters
     ----------
@@ -281,6 +336,9 @@ def sort_files(origin='', dest='', keep_masks = True, \
     # Sort PNG files.
     move_files(origin + '*png', dest + 'png_masks_cleans')
 
+    # Sort CRCAT.FITS files, which are kept even without the masks.
+    move_files(origin + '*crcat.fits', dest + 'flt_masks')
+
     # Sort MASK.FITS files.
     if keep_masks:
         move_files(origin + '*mask.fits', dest + 'flt_masks')
@@ -292,7 +350,237 @@ def sort_files(origin='', dest='', keep_masks = True, \
 
 #-------------------------------------------------------------------------------#
 
-def run_lacosmic(filename, sigclip, sigfrac, objlim, niter, sigclip_pf):
+def lacos_python(filename, sigclip, sigfrac, objlim, niter, \
+                 noise_model='median', dq_bits=None, cache_dir=None, \
+                 cache_size=None):
+    """Runs the Python port of ``LACosmic``, :mod:`lacos_engine`, over
+    the first SCI extension of an FLT file.
+
+    Parameters:
+        filename : string
+            Name of the FITS file, including the path.
+        sigclip : float
+            Detection limit for cosmic rays.
+        sigfrac : float
+            Detection limit for adjacent pixels.
+        objlim : int
+            Max number of objects desired in image.
+        niter : int
+            Number of iterations of cosmic ray finder.
+        noise_model : {'median', 'err', 'header'}
+            See :mod:`noise_model`.
+        dq_bits : int, optional
+            DQ flags of known bad pixels, e.g., :data:`DQ_BITS`.
+            Pixels with any of these flags in the DQ extension are
+            not searched for CRs nor used to clean them. If None,
+            the DQ is not read.
+        cache_dir : string, optional
+            Directory of an on-disk cache of the detection maps, so
+            that reruns with other thresholds skip rebuilding them.
+            See :mod:`lacos_cache`.
+        cache_size : float, optional
+            Size cap of the cache in MB. By default,
+            :data:`lacos_cache.CACHE_MAX_BYTES`.
+
+    Returns:
+        nothing
+
+    Outputs:
+        Cleaned FITS file, ``<file rootname>.clean.fits``.
+        Mask FITS file, ``<file rootname>.mask.fits``. CRs are 1 and
+        DQ flagged pixels are :data:`DQ_MASK_VALUE`.
+        Both with the primary and SCI headers merged, as from ``IRAF``.
+        CR catalog, ``<file rootname>.crcat.fits``. See :mod:`cr_catalog`.
+    """
+    flt = read_flt(filename, noise_model=noise_model, dq_bits=dq_bits)
+    products = clean_flt(flt, sigclip, sigfrac, objlim, niter, \
+                         cache=open_cache(cache_dir, cache_size))
+    write_products(filename, products)
+
+
+#-------------------------------------------------------------------------------#
+
+def open_cache(cache_dir=None, cache_size=None):
+    """Opens the detection map cache of :func:`lacos_python`.
+
+    Parameters:
+        cache_dir : string, optional
+            Directory of the cache. If None, no cache.
+        cache_size : float, optional
+            Size cap of the cache in MB.
+
+    Returns:
+        cache : lacos_cache.IntermediateCache or None
+    """
+    if cache_dir is None:
+        return None
+
+    from lacosmic.lacos_cache import IntermediateCache
+    from lacosmic.lacos_cache import CACHE_MAX_BYTES
+    if cache_size is None:
+        return IntermediateCache(cache_dir, CACHE_MAX_BYTES)
+    return IntermediateCache(cache_dir, cache_size * 1e6)
+
+
+def read_flt(filename, noise_model='median', dq_bits=None):
+    """Reads all that :func:`clean_flt` needs of an FLT into memory.
+
+    Parameters:
+        filename : string
+            Name of the FITS file, including the path.
+        noise_model, dq_bits :
+            See :func:`lacos_python`.
+
+    Returns:
+        flt : dictionary
+            'image', 'noise', 'badpix', 'header' (primary and SCI
+            merged), and the 'filter' and 'flshcorr' of the primary
+            header.
+    """
+    import numpy as np
+    from astropy.io import fits
+
+    from lacosmic.noise_model import make_noise_map
+
+    fits_file = fits.open(filename)
+    flt = {'image':np.array(fits_file[1].data),
+           'noise':make_noise_map(noise_model, fits_file, 1, GAIN, READN),
+           'badpix':None,
+           'header':inherit_header(fits_file[0].header, fits_file[1].header),
+           'filter':fits_file[0].header['FILTER'],
+           'flshcorr':fits_file[0].header['FLSHCORR']}
+    if dq_bits is not None:
+        flt['badpix'] = (fits_file['DQ', 1].data & dq_bits) != 0
+    fits_file.close()
+    return flt
+
+
+def clean_flt(flt, sigclip, sigfrac, objlim, niter, cache=None):
+    """Runs :func:`lacos_engine.lacos_im` over an FLT read by
+    :func:`read_flt`.
+
+    Parameters:
+        flt : dictionary
+            Output of :func:`read_flt`.
+        sigclip, sigfrac, objlim, niter :
+            See :func:`lacos_python`.
+        cache : lacos_cache.IntermediateCache, optional
+            See :func:`open_cache`.
+
+    Returns:
+        products : dictionary
+            'clean', 'mask' (CRs are 1 and DQ flagged pixels are
+            :data:`DQ_MASK_VALUE`), 'catalog' and 'header'.
+    """
+    import numpy as np
+
+    from lacosmic.cr_catalog import cr_catalog
+    from lacosmic.lacos_engine import lacos_im
+
+    clean, mask = lacos_im(flt['image'], \
+                           gain=GAIN, \
+                           readn=READN, \
+                           sigclip=sigclip, \
+                           sigfrac=sigfrac, \
+                           objlim=objlim, \
+                           niter=niter, \
+                           noise=flt['noise'], \
+                           badpix=flt['badpix'], \
+                           cache=cache)
+    catalog = cr_catalog(mask, flt['image'], clean)
+
+    mask = mask.astype(np.int16)
+    if flt['badpix'] is not None:
+        mask[flt['badpix']] = DQ_MASK_VALUE
+
+    return {'clean':clean, 'mask':mask, 'catalog':catalog, \
+            'header':flt['header']}
+
+
+def write_products(filename, products):
+    """Writes the products of :func:`clean_flt`.
+
+    Parameters:
+        filename : string
+            Name of the FITS file, including the path.
+        products : dictionary
+            Output of :func:`clean_flt`.
+
+    Returns:
+        nothing
+
+    Outputs:
+        See :func:`lacos_python`.
+    """
+    from astropy.io import fits
+
+    from lacosmic.cr_catalog import write_catalog
+
+    header = products['header']
+    write_catalog(filename, products['catalog'], header)
+    fits.PrimaryHDU(products['clean'], header=header).writeto( \
+        filename.split('.fits')[0]+'.clean.fits', overwrite=True)
+    fits.PrimaryHDU(products['mask'], header=header).writeto( \
+        filename.split('.fits')[0]+'.mask.fits', overwrite=True)
+
+
+#-------------------------------------------------------------------------------#
+
+def select_sigclip(flshcorr, sigclip, sigclip_pf):
+    """Picks the detection limit for whether the image is
+    post-flashed.
+
+    Parameters:
+        flshcorr : string
+            FLSHCORR of the primary header.
+        sigclip : float
+            Detection limit for cosmic rays.
+        sigclip_pf : float
+            Detection limit for cosmic rays in Post-Flashed images.
+            0.0 if no Post-Flashed data.
+
+    Returns:
+        sigclip : float
+            The detection limit to use.
+    """
+    if sigclip_pf == 0.0 or flshcorr == 'OMIT':
+        print 'FLSHCORR set to OMIT.'
+    elif flshcorr == 'COMPLETE':
+        sigclip = sigclip_pf
+        print 'FLSHCORR set to COMPLETE.'
+    return sigclip
+
+
+#-------------------------------------------------------------------------------#
+
+def check_engine_options(engine, noise_model='median', dq_bits=None, \
+                         cache_dir=None):
+    """Checks that the engine supports the options given, so that a
+    run fails before its first FLT rather than at every FLT.
+
+    Parameters:
+        engine, noise_model, dq_bits, cache_dir :
+            See :func:`run_lacosmic`.
+
+    Returns:
+        nothing
+    """
+    if engine not in ENGINES:
+        raise ValueError("engine must be one of " + str(ENGINES))
+    if engine == 'iraf' and noise_model != 'median':
+        raise ValueError("noise_model '" + noise_model + \
+                         "' needs the 'python' engine.")
+    if engine == 'iraf' and dq_bits is not None:
+        raise ValueError("dq_bits needs the 'python' engine.")
+    if engine == 'iraf' and cache_dir is not None:
+        raise ValueError("cache_dir needs the 'python' engine.")
+
+
+#-------------------------------------------------------------------------------#
+
+def run_lacosmic(filename, sigclip, sigfrac, objlim, niter, sigclip_pf, \
+                 engine='iraf', noise_model='median', dq_bits=None, \
+                 cache_dir=None, cache_size=None):
     """Runs ``IRAF/LACosmic`` over an FLT file.
 
     Parameters:
@@ -309,6 +597,21 @@ def run_lacosmic(filename, sigclip, sigfrac, objlim, niter, sigclip_pf):
         sigclip_pf : float
             Detection limit for cosmic rays in Post-Flashed images.
             Set to 0.0 if no Post-Flashed data.
+        engine : {'iraf', 'python'}
+            'iraf' by default, the ``IRAF`` task. 'python' runs
+            :func:`lacos_python`.
+        noise_model : {'median', 'err', 'header'}
+            'median' by default, the ``LACosmic`` noise model. The
+            others, which take the noise from the FLT's ERR extension
+            or header, need the 'python' engine. See :mod:`noise_model`.
+        dq_bits : int, optional
+            DQ flags of known bad pixels to exclude from the search.
+            Needs the 'python' engine. See :func:`lacos_python`.
+        cache_dir : string, optional
+            Directory to cache the detection maps in. Needs the
+            'python' engine. See :func:`lacos_python`.
+        cache_size : float, optional
+            Size cap of the cache in MB.
 
     Returns:
         nothing
@@ -316,6 +619,8 @@ def run_lacosmic(filename, sigclip, sigfrac, objlim, niter, sigclip_pf):
     Outputs:
         ``IRAF/LACosmic`` cleaned FITS file,
         ``<file rootname>.clean.fits``.
+        Mask FITS file, ``<file rootname>.mask.fits``.
+        CR catalog, ``<file rootname>.crcat.fits``. See :mod:`cr_catalog`.
     """
     filename = str(filename)
     sigclip = float(sigclip)
@@ -324,34 +629,224 @@ def run_lacosmic(filename, sigclip, sigfrac, objlim, niter, sigclip_pf):
     niter = int(niter)
     sigclip_pf = float(sigclip_pf)
 
+    check_engine_options(engine, noise_model, dq_bits, cache_dir)
+
+    from astropy.io import fits
+
     # Read the header for whether the image is post-flashed.
     fits_file = fits.open(filename)
     flshcorr = fits_file[0].header['FLSHCORR']
     fits_file.close()
+    sigclip = select_sigclip(flshcorr, sigclip, sigclip_pf)
 
-    if sigclip_pf == 0.0 or flshcorr == 'OMIT':
-        sigclip = sigclip
-        print 'FLSHCORR set to OMIT.'
-    elif flshcorr == 'COMPLETE':
-        sigclip = sigclip_pf
-        print 'FLSHCORR set to COMPLETE.'
+    if engine == 'python':
+        lacos_python(filename, sigclip, sigfrac, objlim, niter, \
+                     noise_model=noise_model, dq_bits=dq_bits, \
+                     cache_dir=cache_dir, cache_size=cache_size)
+        return
+
+    from pyraf import iraf
     iraf.lacos_im(filename+'[1]', \
                   filename.split('.fits')[0]+'.clean.fits', \
                   filename.split('.fits')[0]+'.mask.fits', \
-                  gain=1.5, \
-                  readn=3.0, \
+                  gain=GAIN, \
+                  readn=READN, \
                   sigclip=sigclip, \
                   sigfrac=sigfrac, \
                   objlim=objlim, \
                   niter=niter)
 
+    from lacosmic.cr_catalog import catalog_from_files
+    catalog_from_files(filename)
+
+
+#-------------------------------------------------------------------------------#
+
+def run_lacosmic_file(filename, dest='', temp_folder=False, create_png=True, \
+                      engine='iraf', noise_model='median', dq_bits=None, \
+                      cache_dir=None, cache_size=None):
+    """Runs LACosmic over one FLT with the parameters of its filter,
+    creates its PNG, and sorts its outputs. The ``IRAF`` task must
+    already be defined, with :func:`define_lacosmic`.
+
+    Parameters:
+        filename : string
+            Name of the FITS file, including the path.
+        dest : string
+            Path where you want the output directories to go.
+        temp_folder : {True, False}
+            See :func:`sort_files`.
+        create_png : {True, False}
+            True by default. Switch off if do not want a diagnostic PNG.
+        engine, noise_model, dq_bits, cache_dir, cache_size :
+            See :func:`run_lacosmic`.
+
+    Returns:
+        nothing
+
+    Outputs:
+        Clean, mask, and PNG files of `filename`, in the `dest`
+        directories of :func:`sort_files`.
+    """
+    filt = get_keyval(filename=filename, keyword='filter')
+    params = lacosmic_params(filt)
+
+    run_lacosmic(filename, *params, engine=engine, \
+                 noise_model=noise_model, dq_bits=dq_bits, \
+                 cache_dir=cache_dir, cache_size=cache_size)
+    if create_png:
+        create_images_png(filename)
+
+    # Sort only this file's outputs; other workers may be writing theirs.
+    sort_files(origin=filename.split('.fits')[0], dest=dest, \
+               keep_masks=True, temp_folder=temp_folder)
+
+
+#-------------------------------------------------------------------------------#
+
+def run_lacosmic_pipelined(fits_list, dest='', temp_folder=False, \
+                           create_png=True, noise_model='median', \
+                           dq_bits=None, cache_dir=None, cache_size=None, \
+                           prefetch=2, write_threads=2):
+    """Runs the 'python' engine over the FLTs with the reads and
+    writes overlapped with the computation. See :mod:`pipeline`.
+
+    Parameters:
+        fits_list : list of strings
+            The FLTs.
+        prefetch : int
+            Number of FLTs to read ahead.
+        write_threads : int
+            Number of threads writing the clean, mask and PNG files.
+        dest, temp_folder, create_png, noise_model, dq_bits,
+        cache_dir, cache_size :
+            See :func:`run_lacosmic_main`.
+
+    Returns:
+        nothing
+
+    Outputs:
+        See :func:`run_lacosmic_file`.
+    """
+    from lacosmic.pipeline import run_pipelined
+
+    cache = open_cache(cache_dir, cache_size)
+    param_dict = lacosmic_param_dictionary()
+
+    def read(filename):
+        return read_flt(filename, noise_model=noise_model, dq_bits=dq_bits)
+
+    def compute(filename, flt):
+        sigclip, sigfrac, objlim, niter, sigclip_pf = \
+            lacosmic_params(flt['filter'], param_dict)
+        sigclip = select_sigclip(flt['flshcorr'], sigclip, sigclip_pf)
+        return clean_flt(flt, sigclip, sigfrac, objlim, niter, cache=cache)
+
+    def write(filename, products):
+        write_products(filename, products)
+        if create_png:
+            create_images_png(filename)
+        sort_files(origin=filename.split('.fits')[0], dest=dest, \
+                   keep_masks=True, temp_folder=temp_folder)
+
+    run_pipelined(fits_list, read, compute, write, prefetch=prefetch, \
+                  write_threads=write_threads)
+
+
+#-------------------------------------------------------------------------------#
+
+def run_lacosmic_worker(queue_dir, dest='', path_to_lacos_im='', \
+                        temp_folder=False, create_png=True, engine='iraf', \
+                        noise_model='median', dq_bits=None, \
+                        cache_dir=None, cache_size=None, stale_timeout=300.):
+    """Processes FLTs from a shared work queue until it is empty.
+    Start as many as you like, on any nodes that see `queue_dir`.
+
+    Parameters:
+        queue_dir : string
+            Path to the queue, built by :func:`run_lacosmic_main`.
+        stale_timeout : float
+            Seconds without a heartbeat after which the job of a dead
+            worker is given to another. Heartbeats are sent every
+            tenth of this.
+        dest, path_to_lacos_im, temp_folder, create_png, engine,
+        noise_model, dq_bits, cache_dir, cache_size :
+            See :func:`run_lacosmic_main`.
+
+    Returns:
+        nothing
+
+    Outputs:
+        See :func:`run_lacosmic_file`.
+    """
+    from lacosmic.work_queue import WorkQueue
+    from lacosmic.work_queue import run_worker
+
+    queue = WorkQueue(queue_dir, stale_timeout=stale_timeout)
+    if engine == 'iraf':
+        define_lacosmic(path_to_lacos_im)
+
+    def process(filename):
+        run_lacosmic_file(filename, dest=dest, temp_folder=temp_folder, \
+                          create_png=create_png, engine=engine, \
+                          noise_model=noise_model, dq_bits=dq_bits, \
+                          cache_dir=cache_dir, cache_size=cache_size)
+
+    ndone = run_worker(queue, process, heartbeat=stale_timeout / 10.)
+    print "Worker finished", ndone, "FLTs."
+
+
+#-------------------------------------------------------------------------------#
+
+def run_lacosmic_queue(fits_list, queue_dir, nworkers, **kwargs):
+    """Queues the FLTs in `queue_dir` and runs `nworkers` workers on
+    them in this node.
+
+    Parameters:
+        fits_list : list of strings
+            FLTs to queue.
+        queue_dir : string
+            Path to the queue.
+        nworkers : int
+            Number of worker processes to run.
+        kwargs :
+            Passed to :func:`run_lacosmic_worker`.
+
+    Returns:
+        nothing
+    """
+    import multiprocessing
+    from lacosmic.work_queue import WorkQueue
+
+    queue = WorkQueue(queue_dir)
+    nadded = len([fits for fits in fits_list if queue.add(fits)])
+    print "Queued", nadded, "new FLTs in", queue_dir
+
+    if nworkers == 1:
+        run_lacosmic_worker(queue_dir, **kwargs)
+    else:
+        workers = [multiprocessing.Process(target=run_lacosmic_worker, \
+                                           args=(queue_dir,), kwargs=kwargs) \
+                   for i in range(nworkers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    print "Queue state:", queue.counts()
+
 
 #-------------------------------------------------------------------------------#
 # Main controller.
 #-------------------------------------------------------------------------------#
 
 def run_lacosmic_main(origin='', dest='', path_to_lacos_im='', \
-                      temp_folder=False, create_png=True):
+                      temp_folder=False, create_png=True, engine='iraf', \
+                      noise_model='median', dq_bits=None, cache_dir=None, \
+                      cache_size=None, queue_dir=None, nworkers=1, \
+                      stale_timeout=300., memory_budget=None, \
+                      max_workers=None, memory_model=None, prefetch=None, \
+                      write_threads=2):
     """Main to run lacosmic suite.
 
     Parameters
@@ -371,6 +866,48 @@ def run_lacosmic_main(origin='', dest='', path_to_lacos_im='', \
         in `flt_cleans/lacos_temp/`.
     create_png : {True, False}
         True by default. Switch off if do not want a diagnostic PNG.
+    engine : {'iraf', 'python'}
+        'iraf' by default. See :func:`run_lacosmic`.
+    noise_model : {'median', 'err', 'header'}
+        'median' by default. See :func:`run_lacosmic`.
+    dq_bits : int, optional
+        None by default. See :func:`run_lacosmic`.
+    cache_dir : string, optional
+        None by default. See :func:`run_lacosmic`.
+    cache_size : float, optional
+        None by default. See :func:`run_lacosmic`.
+    queue_dir : string, optional
+        None by default. If given, the FLTs are added to a work queue
+        in this directory, on a filesystem shared by all nodes, and
+        processed by :func:`run_lacosmic_worker`. Run the same command
+        on every node; FLTs already queued are not queued again.
+    nworkers : int
+        1 by default. Number of workers to start on this node in
+        queue mode.
+    stale_timeout : float
+        300 by default. See :func:`run_lacosmic_worker`.
+    memory_budget : float, optional
+        None by default. If given, the memory in MB that the FLTs
+        may use together. They are run in parallel, as many at a time
+        as fit by their estimated memory. See :mod:`scheduler`.
+    max_workers : int, optional
+        None by default, the number of CPUs. Most FLTs to run at
+        once under `memory_budget`.
+    memory_model : string, optional
+        None by default. JSON file in which to keep the memory
+        learned per pixel between runs, under `memory_budget`.
+    prefetch : int, optional
+        None by default. If given, the FLTs are read this many ahead,
+        and their outputs written by `write_threads` threads, while
+        the next FLT is cleaned. Needs the 'python' engine. See
+        :func:`run_lacosmic_pipelined`.
+    write_threads : int
+        2 by default. Number of threads writing outputs, with
+        `prefetch`.
+
+    Only one of `queue_dir`, `memory_budget` and `prefetch` may be
+    given. Options the engine does not support raise ``ValueError``
+    before any FLT is run.
 
     Outputs
     -------
@@ -380,34 +917,70 @@ def run_lacosmic_main(origin='', dest='', path_to_lacos_im='', \
     ``<file rootname>.mask.fits``.
     PNG files, ``<file rootname>.png``.
     """
-    param_dict = lacosmic_param_dictionary()
+    modes = [name for name, value in [('queue_dir', queue_dir), \
+                                      ('memory_budget', memory_budget), \
+                                      ('prefetch', prefetch)] \
+             if value is not None]
+    if len(modes) > 1:
+        raise ValueError("Only one of " + ", ".join(modes) + " may be given.")
+    check_engine_options(engine, noise_model, dq_bits, cache_dir)
+    if prefetch is not None and engine != 'python':
+        raise ValueError("prefetch needs the 'python' engine.")
+
     fits_list = glob.glob(origin + '*fl*.fits')
-    filt = get_keyval(filename=fits_list[0], keyword='filter')
-    print "PATH TO LACOS_IM:", path_to_lacos_im
-    define_lacosmic(path_to_lacos_im)
 
-    # Run LACOSMIC.
-    for fits in fits_list:
-        if filt not in param_dict.keys():
-            print "Filter not in Param Dictionary. Using default values."
-            if 'N' in filt:
-                sigclip = 4.5
-                objlim = 5
-            else:
-                sigclip = 5.0
-                objlim = 2
-            sigfrac = 0.3
-            niter = 3
-            sigclip_pf = 9.5
+    if queue_dir is not None:
+        run_lacosmic_queue(fits_list, queue_dir, nworkers, dest=dest, \
+                           path_to_lacos_im=path_to_lacos_im, \
+                           temp_folder=temp_folder, create_png=create_png, \
+                           engine=engine, noise_model=noise_model, \
+                           dq_bits=dq_bits, cache_dir=cache_dir, \
+                           cache_size=cache_size, stale_timeout=stale_timeout)
+        return
+
+    if memory_budget is not None:
+        from lacosmic.scheduler import run_scheduled
+
+        def process(filename):
+            if engine == 'iraf':
+                define_lacosmic(path_to_lacos_im)
+            run_lacosmic_file(filename, dest=dest, temp_folder=temp_folder, \
+                              create_png=create_png, engine=engine, \
+                              noise_model=noise_model, dq_bits=dq_bits, \
+                              cache_dir=cache_dir, cache_size=cache_size)
+
+        failed = run_scheduled(fits_list, process, memory_budget * 1e6, \
+                               engine=engine, max_workers=max_workers, \
+                               model_file=memory_model)
+        for filename in failed:
+            print "Failed:", filename
+            print failed[filename]
+        return
+
+    if prefetch is not None:
+        run_lacosmic_pipelined(fits_list, dest=dest, temp_folder=temp_folder, \
+                               create_png=create_png, noise_model=noise_model, \
+                               dq_bits=dq_bits, cache_dir=cache_dir, \
+                               cache_size=cache_size, prefetch=prefetch, \
+                               write_threads=write_threads)
+        return
 
-        else:
-            sigclip = param_dict[filt][0]
-            sigfrac = param_dict[filt][1]
-            objlim = param_dict[filt][2]
-            niter = param_dict[filt][3]
-            sigclip_pf = param_dict[filt][4]
+    param_dict = lacosmic_param_dictionary()
+    if engine == 'iraf':
+        print "PATH TO LACOS_IM:", path_to_lacos_im
+        define_lacosmic(path_to_lacos_im)
 
-        run_lacosmic(fits, sigclip, sigfrac, objlim, niter, sigclip_pf)
+    # Run LACOSMIC, with the parameters of each FLT's own filter, as
+    # in the other modes.
+    for fits in fits_list:
+        filt = get_keyval(filename=fits, keyword='filter')
+        sigclip, sigfrac, objlim, niter, sigclip_pf = \
+            lacosmic_params(filt, param_dict)
+
+        run_lacosmic(fits, sigclip, sigfrac, objlim, niter, sigclip_pf, \
+                     engine=engine, noise_model=noise_model, \
+                     dq_bits=dq_bits, cache_dir=cache_dir, \
+                     cache_size=cache_size)
         if create_png:
             create_images_png(fits)
 
@@ -415,9 +988,11 @@ def run_lacosmic_main(origin='', dest='', path_to_lacos_im='', \
     sort_files(origin=origin, dest=dest, keep_masks=True, \
                temp_folder=temp_folder)
 
+
 #-------------------------------------------------------------------------------# 
 
 if __name__ == '__main__':
+    from set_paths import set_paths
     paths = set_paths()
 
     run_lacosmic_main(origin='', \
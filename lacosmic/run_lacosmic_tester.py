@@ -28,18 +28,18 @@ Notes:
     10.0. Non-post-flashed images are good around 'sigclip' 5.0, 5.5. 
 """
 
+import glob
 import os
 import shutil
 
-from run_lacosmic import *  # Just this once
-from set_paths import set_paths
-from count_masked_pixels import count_masked_pixels
-from lacosmic_tools import get_keyval
+from lacosmic.run_lacosmic import create_images_png
+from lacosmic.run_lacosmic import define_lacosmic
+from lacosmic.run_lacosmic import run_lacosmic
 
 #-------------------------------------------------------------------------------# 
 
 def run_lacosmic_tester(sigclip_list, sigfrac_list, objlim_list, niter_list, \
-                        count_masked_pixels=False):
+                        count_masked_pixels=False, path_to_lacos_im=''):
     """Tests different parameters of `LACOSMIC`.
     
     Parameters
@@ -55,6 +55,9 @@ def run_lacosmic_tester(sigclip_list, sigfrac_list, objlim_list, niter_list, \
     count_masked_pixels : {True, False}
         Default False. Set to True if want to count the
         number of masked pixels per image.
+    path_to_lacos_im : string
+        Your path to ``lacos_im.cl``.
+        If left blank, assume Current Working Directory.
             
     Outputs
     -------
@@ -63,52 +66,61 @@ def run_lacosmic_tester(sigclip_list, sigfrac_list, objlim_list, niter_list, \
         The number of masked pixels in each mask image.
     """
     
-    filenames = create_file_list()
+    filenames = glob.glob('*fl*.fits')
     # Create subdirectories for each filename
     for filename in filenames:
         dir_rootname = filename.split('.fits')[0]
-        #os.makedirs(dir_rootname)
+        if not os.path.exists(dir_rootname):
+            os.makedirs(dir_rootname)
 
-    paths = set_paths()
-    define_lacosmic(paths['lacos_im'] + 'lacos_im.cl')
+    define_lacosmic(path_to_lacos_im)
     # Run the permutations, creating plots for each
     for filename in filenames:
         for sigclip in sigclip_list:
             for sigfrac in sigfrac_list:
                 for objlim in objlim_list:
-                    run_lacosmic(filename, \
-                                 sigclip, \
-                                 sigfrac, \
-                                 objlim, \
-                                 niter_list[1])
-                    create_images_png(file, str(sigclip) + '_' + \
-                                            str(sigfrac) + '_' + \
-                                 	        str(objlim) + '_' + \
-                                 	        str(niter_list[1]) + '.png')
-
-                    if count_masked_pixels:
-                        # Rename the .clean and .mask files
-                        mask_to_rename = filename.split('.fits')[0]+'.mask.fits'
-                        clean_to_rename = filename.split('.fits')[0]+'.clean.fits'
-                        os.rename(mask_to_rename, str(sigclip) + '_' + \
-                                                  str(sigfrac) + '_' + \
-                                 	              str(objlim) + '_' + \
-                                 	              str(niter_list[1]) + \
-                                 	              '_mask.fits') 
-                        os.rename(clean_to_rename, str(sigclip) + '_' + \
-                                                   str(sigfrac) + '_' + \
-                                 	               str(objlim) + '_' + \
-                                 	               str(niter_list[1]) + \
-                                 	               '_clean.fits') 
-                        
-                        newfiles = glob.glob('*mask*')
-                        print newfiles
-                    elif not count_masked_pixels:
-                        # Delete the .clean and .mask files
-                        clean_to_delete = glob.glob('*.clean.fits')
-                        mask_to_delete = glob.glob('*.mask.fits')
-                        os.remove(clean_to_delete[0]) 
-                        os.remove(mask_to_delete[0]) 
+                    for niter in niter_list:
+                        run_lacosmic(filename, \
+                                     sigclip, \
+                                     sigfrac, \
+                                     objlim, \
+                                     niter, \
+                                     0.0)
+                        create_images_png(filename, str(sigclip) + '_' + \
+                                                str(sigfrac) + '_' + \
+                                     	        str(objlim) + '_' + \
+                                     	        str(niter) + '.png')
+
+                        if count_masked_pixels:
+                            # Rename the .clean and .mask files
+                            mask_to_rename = filename.split('.fits')[0]+'.mask.fits'
+                            clean_to_rename = filename.split('.fits')[0]+'.clean.fits'
+                            os.rename(mask_to_rename, str(sigclip) + '_' + \
+                                                      str(sigfrac) + '_' + \
+                                     	              str(objlim) + '_' + \
+                                     	              str(niter) + \
+                                     	              '_mask.fits') 
+                            os.rename(clean_to_rename, str(sigclip) + '_' + \
+                                                       str(sigfrac) + '_' + \
+                                     	               str(objlim) + '_' + \
+                                     	               str(niter) + \
+                                     	               '_clean.fits') 
+                            os.rename(filename.split('.fits')[0]+'.crcat.fits', \
+                                      str(sigclip) + '_' + \
+                                      str(sigfrac) + '_' + \
+                                      str(objlim) + '_' + \
+                                      str(niter) + \
+                                      '_crcat.fits')
+                            
+                            newfiles = glob.glob('*mask*')
+                            print newfiles
+                        elif not count_masked_pixels:
+                            # Delete the .clean and .mask files
+                            clean_to_delete = glob.glob('*.clean.fits')
+                            mask_to_delete = glob.glob('*.mask.fits')
+                            os.remove(clean_to_delete[0]) 
+                            os.remove(mask_to_delete[0]) 
+                            os.remove(filename.split('.fits')[0]+'.crcat.fits')
         # Move all PNGs into subdirectory of the current filename
         png_files = glob.glob('*.png')
         for png_file in png_files:
@@ -118,9 +130,10 @@ def run_lacosmic_tester(sigclip_list, sigfrac_list, objlim_list, niter_list, \
         if count_masked_pixels:
             mask_files = glob.glob('*mask.fits')
             clean_files = glob.glob('*clean.fits')
-            all_files = mask_files + clean_files
-            for filename in all_files:
-                shutil.move(filename, file.split('.fits')[0])
+            catalog_files = glob.glob('*crcat.fits')
+            all_files = mask_files + clean_files + catalog_files
+            for fits_file in all_files:
+                shutil.move(fits_file, filename.split('.fits')[0])
    
 #    if count_masked_pixels:         
 #        filtername = get_keyval(filename=filename, keyword='FILTER')
@@ -132,6 +145,9 @@ def run_lacosmic_tester(sigclip_list, sigfrac_list, objlim_list, niter_list, \
 #-------------------------------------------------------------------------------# 
 
 if __name__=='__main__':
+    from set_paths import set_paths
+    paths = set_paths()
+
     # Change these how you like.
     sigclip_list = [9.0, 9.5, 10.0]  # Post-flash test values
                   #[5.0, 5.5, 6.0, 6.5]  # Non-post-flash test values
@@ -139,6 +155,7 @@ if __name__=='__main__':
     objlim_list = [2,3,4,5]
     niter_list = [4,5]
 
-    tester_run_lacosmic_v2(sigclip_list, sigfrac_list, objlim_list, niter_list, \
-                           count_masked_pixels=True)
+    run_lacosmic_tester(sigclip_list, sigfrac_list, objlim_list, niter_list, \
+                        count_masked_pixels=True, \
+                        path_to_lacos_im=paths['lacos_im'] + '/')
 
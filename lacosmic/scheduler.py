@@ -0,0 +1,227 @@
+"""
+Runs a batch of FLTs in parallel under a memory budget.
+
+Each FLT's peak memory is estimated from the size and ``BITPIX`` of
+its SCI extension and the engine, and FLTs are only started while the
+sum of the estimates of the running ones fits in the budget. The
+largest FLTs are started first, and the small subarrays are packed
+into the memory left around them. Each FLT runs in its own process,
+whose measured peak RSS is fed back into the estimates.
+
+Author:
+
+    C.M. Gosmeyer
+"""
+
+import json
+import multiprocessing
+import os
+import resource
+import traceback
+
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+# Starting guesses, before any measurements, of the memory each engine
+# needs per SCI pixel, beyond the SCI data itself. The Python engine
+# holds ~20 float32 images at its peak, of which the subsampled
+# Laplacian is 8. IRAF works on disk, in its own process.
+BYTES_PER_PIXEL = {'python':100., 'iraf':10.}
+
+# Least bytes per pixel ever learned, so that a run of small jobs,
+# whose memory hardly grows, cannot drop the estimate of a full frame
+# below what it needs.
+MIN_BYTES_PER_PIXEL = {'python':40., 'iraf':4.}
+
+# Memory of a job that does not grow with the image.
+BASE_BYTES = 30e6
+
+# Weight of each new measurement in the running estimate.
+LEARNING_RATE = 0.5
+
+#-------------------------------------------------------------------------------#
+
+def image_size(filename, ext=1):
+    """Reads the number of pixels and bytes per pixel of an extension
+    from its header.
+
+    Parameters
+    ----------
+    filename : string
+        Name of the FITS file.
+    ext : int
+        Extension to read.
+
+    Returns
+    -------
+    npix : int
+        NAXIS1 * NAXIS2.
+    itemsize : int
+        Bytes per pixel, from BITPIX.
+    """
+    from astropy.io import fits
+
+    header = fits.getheader(filename, ext)
+    return header['NAXIS1'] * header['NAXIS2'], abs(header['BITPIX']) // 8
+
+
+#-------------------------------------------------------------------------------#
+
+class MemoryModel(object):
+    """Estimates the peak memory of a job, and learns from the
+    measured peaks.
+
+    Parameters
+    ----------
+    engine : {'iraf', 'python'}
+        Engine of the jobs.
+    model_file : string, optional
+        JSON file to load the learned bytes per pixel from, and save
+        them to, so they carry over between runs.
+    """
+    def __init__(self, engine, model_file=None):
+        self.engine = engine
+        self.model_file = model_file
+        self.bytes_per_pixel = BYTES_PER_PIXEL[engine]
+        if model_file is not None and os.path.exists(model_file):
+            with open(model_file) as model:
+                self.bytes_per_pixel = max(json.load(model).get(engine, \
+                    self.bytes_per_pixel), MIN_BYTES_PER_PIXEL[engine])
+
+    def estimate(self, npix, itemsize):
+        """Estimated peak memory in bytes of a job on a SCI extension
+        of `npix` pixels of `itemsize` bytes.
+        """
+        return BASE_BYTES + npix * (itemsize + self.bytes_per_pixel)
+
+    def update(self, npix, itemsize, peak):
+        """Moves the bytes per pixel toward what a job whose memory
+        grew by `peak` bytes implies. The growth is measured above
+        the process's memory at its start, so it already excludes
+        :data:`BASE_BYTES`.
+        """
+        measured = peak / float(npix) - itemsize
+        self.bytes_per_pixel += LEARNING_RATE * \
+            (measured - self.bytes_per_pixel)
+        self.bytes_per_pixel = max(self.bytes_per_pixel, \
+                                   MIN_BYTES_PER_PIXEL[self.engine])
+
+    def save(self):
+        """Writes the bytes per pixel to `model_file`, if given."""
+        if self.model_file is None:
+            return
+        learned = {}
+        if os.path.exists(self.model_file):
+            with open(self.model_file) as model:
+                learned = json.load(model)
+        learned[self.engine] = self.bytes_per_pixel
+        with open(self.model_file, 'w') as model:
+            json.dump(learned, model)
+
+
+#-------------------------------------------------------------------------------#
+
+def peak_rss():
+    """Peak resident memory in bytes of this process and its children
+    so far.
+    """
+    # ru_maxrss is in kilobytes on Linux.
+    return 1024 * max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, \
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def run_job(process, filename, results):
+    """Runs `process` on `filename` in a child process and puts
+    (filename, growth of the peak memory in bytes, traceback or None)
+    on `results`.
+    """
+    start = peak_rss()
+    try:
+        process(filename)
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    results.put((filename, peak_rss() - start, error))
+
+
+def wait_for_job(running, results):
+    """Waits for the next result of a running job. A job whose
+    process died without a result (e.g., killed for running out of
+    memory) is returned as failed.
+    """
+    while True:
+        try:
+            return results.get(timeout=1.)
+        except Empty:
+            for filename, (job, estimate) in running.items():
+                if not job.is_alive() and job.exitcode != 0:
+                    return filename, 0, 'Process died with exit code ' + \
+                        str(job.exitcode) + '.'
+
+
+#-------------------------------------------------------------------------------#
+
+def run_scheduled(filenames, process, memory_budget, engine='python', \
+                  max_workers=None, model_file=None):
+    """Runs `process` on each file, in parallel within a memory budget.
+
+    Parameters
+    ----------
+    filenames : list of strings
+        The FLTs.
+    process : function
+        Called with each filename, in a new process.
+    memory_budget : float
+        Bytes the running jobs may use together. A job estimated
+        above the budget is still run, but alone.
+    engine : {'iraf', 'python'}
+        Engine that `process` runs, for the starting estimates.
+    max_workers : int, optional
+        Most jobs to run at once. By default, the number of CPUs.
+    model_file : string, optional
+        See :class:`MemoryModel`.
+
+    Returns
+    -------
+    failed : dictionary
+        {filename : traceback} of the jobs that raised.
+    """
+    if max_workers is None:
+        max_workers = multiprocessing.cpu_count()
+
+    model = MemoryModel(engine, model_file)
+    sizes = dict((filename, image_size(filename)) for filename in filenames)
+    pending = sorted(filenames, key=lambda filename: sizes[filename][0], \
+                     reverse=True)
+    running = {}
+    failed = {}
+    results = multiprocessing.Queue()
+
+    while pending or running:
+        # Admit the largest pending jobs that fit in what is left.
+        used = sum(estimate for (job, estimate) in running.values())
+        for filename in list(pending):
+            if len(running) >= max_workers:
+                break
+            estimate = model.estimate(*sizes[filename])
+            if running and used + estimate > memory_budget:
+                continue
+            job = multiprocessing.Process(target=run_job, \
+                                          args=(process, filename, results))
+            job.start()
+            running[filename] = (job, estimate)
+            pending.remove(filename)
+            used += estimate
+
+        # Wait for any job to finish, and learn from its peak.
+        filename, peak, error = wait_for_job(running, results)
+        running.pop(filename)[0].join()
+        if error is None:
+            model.update(sizes[filename][0], sizes[filename][1], peak)
+        else:
+            failed[filename] = error
+
+    model.save()
+    return failed
@@ -0,0 +1,263 @@
+"""
+A work queue of files on a shared filesystem, so that any number of
+workers, on any number of nodes, can process a batch without a
+scheduler.
+
+The queue is a directory. Each job is a small file holding the path
+to process, and its state is the subdirectory it sits in:
+
+    jobs/      One file per job ever queued, so queueing is idempotent.
+    pending/   Jobs waiting for a worker.
+    claimed/   Jobs being processed, named ``<job>.<worker id>``.
+    done/      Finished jobs.
+    failed/    Jobs that raised, with the traceback in ``<job>.err``.
+
+Jobs are moved between states with ``os.rename``, which is atomic
+within a filesystem, so exactly one worker wins each claim. A worker
+touches its claimed file every `heartbeat` seconds. A claimed file not
+touched for `stale_timeout` seconds belongs to a dead worker, and is
+moved back to pending by the next worker that looks.
+
+Author:
+
+    C.M. Gosmeyer
+"""
+
+import errno
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+
+STATES = ['jobs', 'pending', 'claimed', 'done', 'failed']
+
+#-------------------------------------------------------------------------------#
+
+def worker_name():
+    """Returns an id for this process, unique across nodes."""
+    return socket.gethostname().replace('.', '_') + '-' + str(os.getpid())
+
+
+#-------------------------------------------------------------------------------#
+
+class Heartbeat(threading.Thread):
+    """Touches a claimed job file every `interval` seconds until
+    stopped, to show that its worker is alive.
+    """
+    def __init__(self, path, interval):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                os.utime(self.path, None)
+            except OSError:
+                # Reclaimed by another worker; nothing left to touch.
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+#-------------------------------------------------------------------------------#
+
+class WorkQueue(object):
+    """A work queue in the directory `queue_dir`.
+
+    Parameters
+    ----------
+    queue_dir : string
+        Path to the queue. Must be on a filesystem shared by all
+        workers.
+    stale_timeout : float
+        Seconds after the last heartbeat at which a claimed job is
+        given back to pending. Keep well above the heartbeat interval
+        plus any clock skew between nodes.
+    """
+    def __init__(self, queue_dir, stale_timeout=300.):
+        self.queue_dir = queue_dir
+        self.stale_timeout = stale_timeout
+        for state in STATES:
+            path = os.path.join(queue_dir, state)
+            try:
+                os.makedirs(path)
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+
+    def path(self, state, name=''):
+        """Path to the job `name` in `state`."""
+        return os.path.join(self.queue_dir, state, name)
+
+    def add(self, filename):
+        """Queues `filename`, unless it was already queued.
+
+        Returns
+        -------
+        added : {True, False}
+            False if the job already existed.
+        """
+        name = os.path.basename(filename).split('.fits')[0]
+        try:
+            fd = os.open(self.path('jobs', name), \
+                         os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError as err:
+            if err.errno == errno.EEXIST:
+                return False
+            raise
+        os.write(fd, os.path.abspath(filename).encode())
+        os.close(fd)
+
+        # Write then rename, so workers never see a partial job.
+        temp = self.path('pending', '.' + name + '.' + worker_name())
+        with open(temp, 'w') as job_file:
+            job_file.write(os.path.abspath(filename))
+        os.rename(temp, self.path('pending', name))
+        return True
+
+    def claim(self, worker):
+        """Claims the next pending job for `worker`.
+
+        Returns
+        -------
+        job : tuple or None
+            (name, claimed path, filename to process), or None if
+            nothing is pending.
+        """
+        worker = worker.replace('.', '_')
+
+        # Shuffled, so that workers do not all race for the same job.
+        names = os.listdir(self.path('pending'))
+        random.shuffle(names)
+        for name in names:
+            if name.startswith('.'):
+                continue
+            claimed = self.path('claimed', name + '.' + worker)
+            try:
+                os.rename(self.path('pending', name), claimed)
+            except OSError:
+                # Another worker won this one.
+                continue
+            try:
+                os.utime(claimed, None)
+                with open(claimed) as job_file:
+                    return name, claimed, job_file.read().strip()
+            except (IOError, OSError):
+                # Reclaimed as stale by another worker in between.
+                continue
+        return None
+
+    def complete(self, job):
+        """Moves a claimed `job` to done."""
+        self.finish(job, 'done')
+
+    def fail(self, job, message):
+        """Moves a claimed `job` to failed, with `message` in
+        ``failed/<job>.err``.
+        """
+        with open(self.path('failed', job[0] + '.err'), 'w') as err_file:
+            err_file.write(message)
+        self.finish(job, 'failed')
+
+    def finish(self, job, state):
+        """Moves a claimed `job` to `state`. If it was reclaimed in the
+        meantime, another worker owns it now and it is left alone.
+        """
+        try:
+            os.rename(job[1], self.path(state, job[0]))
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+
+    def reclaim_stale(self):
+        """Moves claimed jobs with no heartbeat, nor claim, in
+        `stale_timeout` seconds back to pending.
+
+        Returns
+        -------
+        reclaimed : list of strings
+            Names of the reclaimed jobs.
+        """
+        reclaimed = []
+        now = time.time()
+        for claimed in os.listdir(self.path('claimed')):
+            try:
+                # The rename into claimed/ keeps the mtime from when the
+                # job was queued, but bumps the ctime.
+                stat = os.stat(self.path('claimed', claimed))
+                age = now - max(stat.st_mtime, stat.st_ctime)
+                if age < self.stale_timeout:
+                    continue
+                name = claimed.rsplit('.', 1)[0]
+                os.rename(self.path('claimed', claimed), \
+                          self.path('pending', name))
+            except OSError:
+                # Finished or reclaimed by someone else meanwhile.
+                continue
+            reclaimed.append(name)
+        return reclaimed
+
+    def counts(self):
+        """Returns the number of jobs in each state."""
+        return dict((state, len([name for name in os.listdir(self.path(state)) \
+                                 if not name.startswith('.') and \
+                                 not name.endswith('.err')])) \
+                    for state in STATES)
+
+
+#-------------------------------------------------------------------------------#
+
+def run_worker(queue, process, worker=None, heartbeat=30.):
+    """Claims and processes jobs from `queue` until none are left.
+
+    While other workers still hold claims, waits and keeps checking
+    for stale ones, so the jobs of dead workers are not lost.
+
+    Parameters
+    ----------
+    queue : WorkQueue
+        The queue.
+    process : function
+        Called with the filename of each job. A raised exception fails
+        the job.
+    worker : string
+        Id of this worker. By default, from :func:`worker_name`.
+    heartbeat : float
+        Seconds between heartbeats.
+
+    Returns
+    -------
+    ndone : int
+        Number of jobs this worker completed.
+    """
+    if worker is None:
+        worker = worker_name()
+
+    ndone = 0
+    while True:
+        queue.reclaim_stale()
+        job = queue.claim(worker)
+        if job is None:
+            if os.listdir(queue.path('claimed')) == []:
+                return ndone
+            time.sleep(heartbeat)
+            continue
+
+        beat = Heartbeat(job[1], heartbeat)
+        beat.start()
+        try:
+            process(job[2])
+        except Exception:
+            beat.stop()
+            queue.fail(job, traceback.format_exc())
+        else:
+            beat.stop()
+            queue.complete(job)
+            ndone += 1
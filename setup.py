@@ -8,5 +8,6 @@ setup(name = 'lacosmic',
       author = 'C.M. Gosmeyer',
       url = 'https://github.com/cgosmeyer/lacosmic',
       packages = find_packages(),
-      install_requires = ['astropy', 'numpy']
+      install_requires = ['astropy', 'numpy', 'scipy'],
+      entry_points = {'console_scripts': ['lacosmic = lacosmic.cli:main']}
      )
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""
+Tests of :mod:`lacosmic.lacos_cache`.
+
+Author:
+
+    C.M. Gosmeyer
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pytest
+
+from lacosmic.lacos_cache import IntermediateCache
+from lacosmic.lacos_engine import lacos_im
+
+#-------------------------------------------------------------------------------#
+
+@pytest.fixture
+def cache_dir():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+def make_frame(seed=0):
+    """A 100x100 frame of sky, a star and a few CRs."""
+    rng = np.random.RandomState(seed)
+    image = rng.normal(200., 15., (100, 100))
+    yy, xx = np.mgrid[:100, :100]
+    image += 3e4 * np.exp(-((yy - 50)**2 + (xx - 50)**2) / 8.)
+    for y, x in [(10, 10), (20, 70), (80, 30), (40, 80)]:
+        image[y:y + 3, x:x + 2] += 2000.
+    return image.astype(np.float32)
+
+
+#-------------------------------------------------------------------------------#
+
+@pytest.mark.parametrize('sigclip, objlim', [(4.5, 4.0), (6.0, 2.0), \
+                                             (4.0, 8.0)])
+def test_rerun_matches_uncached(cache_dir, sigclip, objlim):
+    """Rerunning with other thresholds from the cache gives the same
+    clean image and mask as running without it.
+    """
+    image = make_frame()
+    cache = IntermediateCache(cache_dir)
+    lacos_im(image, gain=1.0, readn=3.0, cache=cache)
+    assert cache.get(cache.key(image, 1.0, 3.0, None)) is not None
+
+    clean, mask = lacos_im(image, gain=1.0, readn=3.0, sigclip=sigclip, \
+                           objlim=objlim, cache=cache)
+    clean_ref, mask_ref = lacos_im(image, gain=1.0, readn=3.0, \
+                                   sigclip=sigclip, objlim=objlim)
+    assert np.array_equal(mask, mask_ref)
+    assert np.array_equal(clean, clean_ref)
+
+
+def test_evicts_least_recently_used(cache_dir):
+    """Over its size cap, the cache drops the entries used longest
+    ago, and ends under the cap.
+    """
+    maps = [np.zeros((50, 50), np.float32), np.ones((50, 50), np.float32)]
+    cache = IntermediateCache(cache_dir)
+    cache.put('a', maps)
+    size = sum(os.path.getsize(os.path.join(cache_dir, 'a', name)) \
+               for name in os.listdir(os.path.join(cache_dir, 'a')))
+    cache.put('b', maps)
+    now = time.time()
+    os.utime(os.path.join(cache_dir, 'a'), (now - 100, now - 100))
+    os.utime(os.path.join(cache_dir, 'b'), (now - 50, now - 50))
+
+    # Using 'a' makes 'b' the least recently used.
+    assert cache.get('a') is not None
+    cache.max_bytes = 2.5 * size
+    cache.put('c', maps)
+    assert sorted(os.listdir(cache_dir)) == ['a', 'c']
+
+    cache.max_bytes = 1.5 * size
+    cache.evict()
+    assert os.listdir(cache_dir) == ['c']
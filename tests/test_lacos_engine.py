@@ -0,0 +1,183 @@
+"""
+Tests of :func:`lacosmic.lacos_engine.lacos_im` on a small synthetic
+frame: a star on a flat sky, with cosmic rays added.
+
+Author:
+
+    C.M. Gosmeyer
+"""
+
+import numpy as np
+import pytest
+
+from lacosmic.lacos_engine import lacos_im
+from lacosmic.lacos_engine import masked_median
+from lacosmic.lacos_engine import masked_median_at
+
+SKY = 200.
+
+# Star in the middle of the frame.
+STAR = (50, 50)
+
+# Two-pixel CRs, and a 4x4 CR whose middle is only found in the
+# second iteration.
+CRS = [(10, 10), (20, 70), (80, 30), (85, 85), (30, 40), (65, 15)]
+BLOB = (slice(40, 44), slice(80, 84))
+
+#-------------------------------------------------------------------------------#
+
+def make_frame(seed=0):
+    """A 100x100 frame of sky and a star, with the CRs of :data:`CRS`
+    and :data:`BLOB`.
+
+    Returns
+    -------
+    image : array
+        The frame, in electrons.
+    crs : array of bools
+        True at the CRs.
+    """
+    rng = np.random.RandomState(seed)
+    image = rng.normal(SKY, np.sqrt(SKY + 9.), (100, 100))
+    yy, xx = np.mgrid[:100, :100]
+    image += 2e5 / (2 * np.pi * 2.**2) * \
+        np.exp(-((yy - STAR[0])**2 + (xx - STAR[1])**2) / (2 * 2.**2))
+
+    crs = np.zeros(image.shape, dtype=bool)
+    for y, x in CRS:
+        crs[y, x:x + 2] = True
+    crs[BLOB] = True
+    image[crs] += 3000.
+    return image.astype(np.float32), crs
+
+
+def clean_frame(image, niter=4):
+    return lacos_im(image, gain=1.0, readn=3.0, sigclip=4.5, sigfrac=0.3, \
+                    objlim=4.0, niter=niter)
+
+
+#-------------------------------------------------------------------------------#
+
+def test_finds_crs():
+    """Every CR pixel is masked and replaced by about the sky."""
+    image, crs = make_frame()
+    clean, mask = clean_frame(image)
+    assert mask[crs].all()
+    assert np.abs(clean[crs] - SKY).max() < 5 * np.sqrt(SKY)
+    assert np.array_equal(clean[~mask], image[~mask])
+
+
+def test_star_not_masked():
+    """The star is left alone."""
+    image, crs = make_frame()
+    clean, mask = clean_frame(image)
+    star = (slice(STAR[0] - 5, STAR[0] + 6), slice(STAR[1] - 5, STAR[1] + 6))
+    assert not mask[star].any()
+    assert np.array_equal(clean[star], image[star])
+
+
+def test_iterations():
+    """The middle of the 4x4 CR is found in the second iteration."""
+    image, crs = make_frame()
+    mask1 = clean_frame(image, niter=1)[1]
+    mask2 = clean_frame(image, niter=2)[1]
+    assert not mask1[BLOB].all()
+    assert mask2[BLOB].all()
+    assert not (mask1 & ~mask2).any()
+
+
+def test_stops_when_converged():
+    """Once an iteration finds no new CRs, more iterations change
+    nothing.
+    """
+    image, crs = make_frame()
+    clean4, mask4 = clean_frame(image, niter=4)
+    clean10, mask10 = clean_frame(image, niter=10)
+    assert np.array_equal(mask4, mask10)
+    assert np.array_equal(clean4, clean10)
+
+
+def test_gain_must_be_positive():
+    image, crs = make_frame()
+    with pytest.raises(ValueError):
+        lacos_im(image, gain=0.)
+
+
+#-------------------------------------------------------------------------------#
+
+def test_badpix_left_alone():
+    """Bad pixels are never masked, nor changed in the clean image."""
+    image, crs = make_frame()
+    badpix = np.zeros(image.shape, dtype=bool)
+    badpix[10, 10] = True
+    badpix[60:62, 60:62] = True
+    image[60:62, 60:62] += 5000.
+    clean, mask = lacos_im(image, gain=1.0, readn=3.0, sigclip=4.5, \
+                           sigfrac=0.3, objlim=4.0, badpix=badpix)
+    assert not mask[badpix].any()
+    assert np.array_equal(clean[badpix], image[badpix])
+    assert mask[10, 11]
+
+
+def test_not_grown_from_badpix():
+    """A CR is not grown through a bad pixel next to it."""
+    rng = np.random.RandomState(0)
+    image = rng.normal(SKY, np.sqrt(SKY + 9.), (40, 40)).astype(np.float32)
+    image[20, 18:20] += 3000.
+    # A hot bad pixel next to the CR, then a pixel too faint to be
+    # found but for growing from the bad pixel.
+    image[20, 20] += 3000.
+    image[20, 21] += 80.
+    badpix = np.zeros(image.shape, dtype=bool)
+    badpix[20, 20] = True
+    clean, mask = lacos_im(image, gain=1.0, readn=3.0, sigclip=4.5, \
+                           sigfrac=0.3, objlim=4.0, badpix=badpix)
+    assert mask[20, 18:20].all()
+    assert not mask[20, 20:22].any()
+
+
+#-------------------------------------------------------------------------------#
+
+@pytest.mark.parametrize('with_badpix', [False, True])
+def test_sparse_replace_matches_full(with_badpix):
+    """Medians taken only at the masked pixels give the same clean
+    image and mask as medians of the whole frame, with CRs on the
+    edges and corners too.
+    """
+    image, crs = make_frame()
+    for y, x in [(0, 0), (0, 50), (50, 0), (99, 98), (1, 99), (98, 1)]:
+        image[y, x:x + 2] += 3000.
+    badpix = None
+    if with_badpix:
+        badpix = np.zeros(image.shape, dtype=bool)
+        badpix[0, 2] = badpix[50, 1] = badpix[99, 97] = True
+        badpix[20, 72] = badpix[41:43, 79] = True
+    clean_sparse, mask_sparse = lacos_im(image, gain=1.0, readn=3.0, \
+                                         sigclip=4.5, sigfrac=0.3, \
+                                         objlim=4.0, badpix=badpix, \
+                                         replace='sparse')
+    clean_full, mask_full = lacos_im(image, gain=1.0, readn=3.0, \
+                                     sigclip=4.5, sigfrac=0.3, objlim=4.0, \
+                                     badpix=badpix, replace='full')
+    assert mask_sparse[0, 0] and mask_sparse[99, 98]
+    assert np.array_equal(mask_sparse, mask_full)
+    assert np.array_equal(clean_sparse, clean_full)
+
+
+def test_masked_median_at_edges():
+    """At every edge pixel, including those whose box is fully
+    masked, the sparse median is that of the full frame.
+    """
+    rng = np.random.RandomState(1)
+    image = rng.normal(SKY, 10., (30, 40)).astype(np.float32)
+    mask = rng.uniform(size=image.shape) < 0.3
+    # Fully masked boxes in a corner and along an edge.
+    mask[:5, :5] = True
+    mask[-3:, 10:20] = True
+    edges = np.zeros(image.shape, dtype=bool)
+    edges[[0, 1, -2, -1], :] = True
+    edges[:, [0, 1, -2, -1]] = True
+    index = np.nonzero(edges)
+    full = masked_median(image, mask)
+    assert full[0, 0] == 0
+    assert np.array_equal(masked_median_at(image, mask, index), full[index])
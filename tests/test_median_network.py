@@ -0,0 +1,75 @@
+"""
+Tests of :mod:`lacosmic.median_network`.
+
+Author:
+
+    C.M. Gosmeyer
+"""
+
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from lacosmic.median_network import median_filter
+from lacosmic.median_network import sort_keys
+from lacosmic.median_network import sorting_network
+
+SPECIAL = [-np.inf, -1e30, -1., -0., 0., 1e-40, 1., 1e30, np.inf]
+
+#-------------------------------------------------------------------------------#
+
+def scipy_median(image, size):
+    return ndimage.median_filter(image, size=size, mode='nearest')
+
+
+@pytest.mark.parametrize('n', range(1, 13))
+def test_sorting_network(n):
+    """The network sorts every sequence of 0s and 1s, so every
+    sequence.
+    """
+    for bits in range(2**n):
+        wires = [(bits >> i) & 1 for i in range(n)]
+        for a, b in sorting_network(n):
+            wires[a], wires[b] = min(wires[a], wires[b]), \
+                                 max(wires[a], wires[b])
+        assert wires == sorted(wires)
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_sort_keys(dtype):
+    """The keys sort as the floats, and turn back into them."""
+    values = np.array(SPECIAL, dtype=dtype)
+    keys = sort_keys(values)
+    assert (np.diff(keys) > 0).all()
+    assert np.array_equal(sort_keys(keys).view(dtype), values)
+
+
+@pytest.mark.parametrize('size', [1, 3, 5, 7])
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_matches_scipy(size, dtype):
+    """Same medians as SciPy, at every shape from smaller than the box
+    to several blocks of rows, with ties, infinities and zeros.
+    """
+    rng = np.random.RandomState(size)
+    shapes = [(1, 1), (1, 9), (9, 1), (2, 3), (7, 6), (13, 29), (300, 150)]
+    for ny, nx in shapes:
+        for image in [rng.normal(0, 100, (ny, nx)), \
+                      rng.randint(-2, 3, (ny, nx)), \
+                      rng.choice(SPECIAL, (ny, nx))]:
+            image = image.astype(dtype)
+            med = median_filter(image, size)
+            assert med.dtype == image.dtype
+            assert np.array_equal(med, scipy_median(image, size))
+
+
+def test_falls_back():
+    """NaNs, integers, and even boxes are left to SciPy."""
+    rng = np.random.RandomState(1)
+    image = rng.normal(0, 1, (20, 20)).astype(np.float32)
+    image[5, 5] = np.nan
+    np.testing.assert_array_equal(median_filter(image, 5), \
+                                  scipy_median(image, 5))
+    ints = rng.randint(0, 100, (20, 20))
+    assert np.array_equal(median_filter(ints, 3), scipy_median(ints, 3))
+    assert np.array_equal(median_filter(image[6:, 6:], 4), \
+                          scipy_median(image[6:, 6:], 4))
@@ -0,0 +1,72 @@
+"""
+Tests of :mod:`lacosmic.noise_model`.
+
+Author:
+
+    C.M. Gosmeyer
+"""
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from lacosmic.noise_model import AMP_SPLIT
+from lacosmic.noise_model import amp_columns
+from lacosmic.noise_model import err_noise
+from lacosmic.noise_model import make_noise_map
+
+#-------------------------------------------------------------------------------#
+
+def test_single_amp():
+    """A subarray read by one amplifier uses it for every column."""
+    amps = amp_columns(fits.Header({'CCDAMP':'C'}), \
+                       fits.Header({'CCDCHIP':1, 'LTV1':-2000.}), 100)
+    assert (amps == 'C').all()
+
+
+@pytest.mark.parametrize('chip, left, right', [(1, 'A', 'B'), (2, 'C', 'D')])
+def test_full_chip_split(chip, left, right):
+    """A full chip is split between its two amplifiers at
+    :data:`AMP_SPLIT`.
+    """
+    amps = amp_columns(fits.Header({'CCDAMP':'ABCD'}), \
+                       fits.Header({'CCDCHIP':chip, 'LTV1':0.}), 4096)
+    assert (amps[:AMP_SPLIT] == left).all()
+    assert (amps[AMP_SPLIT:] == right).all()
+
+
+def test_subarray_across_split():
+    """A subarray is placed on the chip by LTV1."""
+    amps = amp_columns(fits.Header({'CCDAMP':'ABCD'}), \
+                       fits.Header({'CCDCHIP':2, 'LTV1':-2000.}), 100)
+    assert (amps[:48] == 'C').all()
+    assert (amps[48:] == 'D').all()
+
+
+#-------------------------------------------------------------------------------#
+
+def test_err_bad_values():
+    """Non-finite and non-positive ERR values get the median ERR."""
+    err = np.full((20, 20), 5., dtype=np.float32)
+    err[3, 4] = np.nan
+    err[10, 10] = np.inf
+    err[15, 2] = 0.
+    err[0, 0] = -1.
+    noise = err_noise(err)
+    assert np.isfinite(noise).all()
+    assert (noise == 5.).all()
+
+
+def test_err_no_valid_pixels():
+    with pytest.raises(ValueError):
+        err_noise(np.zeros((10, 10)))
+
+
+def test_err_found_by_name():
+    """The ERR extension is found by name, not by its position."""
+    hdulist = fits.HDUList([fits.PrimaryHDU(), \
+        fits.ImageHDU(np.zeros((10, 10), np.float32), name='SCI'), \
+        fits.ImageHDU(np.ones((10, 10), np.int16), name='DQ'), \
+        fits.ImageHDU(np.full((10, 10), 3., np.float32), name='ERR')])
+    noise = make_noise_map('err', hdulist, 1, 1.5, 3.0)
+    assert (noise == 3.).all()
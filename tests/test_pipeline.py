@@ -0,0 +1,109 @@
+"""
+Tests of :mod:`lacosmic.pipeline`.
+
+Author:
+
+    C.M. Gosmeyer
+"""
+
+import threading
+import time
+
+import pytest
+
+from lacosmic.pipeline import PipelineError
+from lacosmic.pipeline import run_pipelined
+
+ITEMS = list(range(8))
+
+#-------------------------------------------------------------------------------#
+
+def fail_at(bad, delays=None):
+    """Returns a stage function that raises for the items in `bad`,
+    after sleeping `delays[item]` seconds.
+    """
+    def stage(item, *args):
+        time.sleep((delays or {}).get(item, 0.))
+        if item in bad:
+            raise ValueError('item ' + str(item))
+        return item
+    return stage
+
+
+def run(read=None, compute=None, write=None, write_threads=2):
+    """Runs the pipeline over :data:`ITEMS`, with the stages that are
+    not given passing the items through.
+
+    Returns
+    -------
+    computed : list
+        Items computed, in order.
+    written : list
+        Items written, sorted.
+    """
+    computed = []
+    written = []
+    lock = threading.Lock()
+
+    def do_compute(item, data):
+        computed.append(item)
+        return (compute or fail_at([]))(item, data)
+
+    def do_write(item, products):
+        (write or fail_at([]))(item, products)
+        with lock:
+            written.append(item)
+
+    run_pipelined(ITEMS, read or fail_at([]), do_compute, do_write, \
+                  prefetch=2, write_threads=write_threads)
+    return computed, sorted(written)
+
+
+#-------------------------------------------------------------------------------#
+
+def test_runs_every_item():
+    computed, written = run()
+    assert computed == ITEMS
+    assert written == ITEMS
+
+
+@pytest.mark.parametrize('stage', ['read', 'compute', 'write'])
+def test_failure(stage):
+    """A failure in any stage raises that stage's error of the item."""
+    with pytest.raises(PipelineError) as err:
+        run(**{stage:fail_at([3])})
+    assert err.value.stage == stage
+    assert err.value.item == 3
+    assert 'item 3' in str(err.value)
+
+
+def test_read_failure_stops_compute():
+    """Items after one that failed to read are not computed."""
+    computed = []
+
+    def compute(item, data):
+        computed.append(item)
+        return item
+
+    with pytest.raises(PipelineError):
+        run_pipelined(ITEMS, fail_at([3]), compute, fail_at([]))
+    assert computed == [0, 1, 2]
+
+
+def test_earliest_write_failure():
+    """When item 3 fails to write before item 2 does, item 2's error is
+    raised.
+    """
+    with pytest.raises(PipelineError) as err:
+        run(write=fail_at([2, 3], {2:0.3}))
+    assert err.value.item == 2
+
+
+def test_earliest_across_stages():
+    """A write failure of item 1, which comes after a compute failure
+    of item 3, is still the one raised.
+    """
+    with pytest.raises(PipelineError) as err:
+        run(compute=fail_at([3]), write=fail_at([1], {1:0.3}))
+    assert err.value.stage == 'write'
+    assert err.value.item == 1
@@ -0,0 +1,65 @@
+"""
+Tests of the option checks of :mod:`lacosmic.run_lacosmic`.
+
+Author:
+
+    C.M. Gosmeyer
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+if sys.version_info[0] > 2:
+    pytest.skip('run_lacosmic is Python 2.', allow_module_level=True)
+
+from lacosmic.run_lacosmic import check_engine_options
+from lacosmic.run_lacosmic import run_lacosmic_main
+
+#-------------------------------------------------------------------------------#
+
+@pytest.fixture
+def origin():
+    path = tempfile.mkdtemp()
+    yield path + '/'
+    shutil.rmtree(path)
+
+
+@pytest.mark.parametrize('modes', [{'queue_dir':'queue', 'prefetch':2}, \
+                                   {'queue_dir':'queue', 'memory_budget':100.}, \
+                                   {'memory_budget':100., 'prefetch':2}])
+def test_conflicting_modes(origin, modes):
+    """Giving more than one run mode fails before the queue is made."""
+    if 'queue_dir' in modes:
+        modes['queue_dir'] = os.path.join(origin, 'queue')
+    with pytest.raises(ValueError, match='Only one of'):
+        run_lacosmic_main(origin=origin, dest=origin, engine='python', \
+                          **modes)
+    assert not os.path.exists(os.path.join(origin, 'queue'))
+
+
+@pytest.mark.parametrize('options', [{'noise_model':'err'}, \
+                                     {'dq_bits':4}, \
+                                     {'cache_dir':'cache'}])
+def test_iraf_options_up_front(origin, options):
+    """Options of the 'python' engine fail before any FLT is queued."""
+    queue_dir = os.path.join(origin, 'queue')
+    with pytest.raises(ValueError, match="needs the 'python' engine"):
+        run_lacosmic_main(origin=origin, dest=origin, engine='iraf', \
+                          queue_dir=queue_dir, **options)
+    assert not os.path.exists(queue_dir)
+
+
+def test_prefetch_needs_python(origin):
+    with pytest.raises(ValueError, match="prefetch needs"):
+        run_lacosmic_main(origin=origin, dest=origin, prefetch=2)
+
+
+def test_engine_options():
+    check_engine_options('python', 'err', 4, 'cache')
+    check_engine_options('iraf')
+    with pytest.raises(ValueError, match='engine must be'):
+        check_engine_options('idl')
@@ -0,0 +1,47 @@
+"""
+Tests of the memory model of :mod:`lacosmic.scheduler`.
+
+Author:
+
+    C.M. Gosmeyer
+"""
+
+import json
+import os
+import tempfile
+
+from lacosmic.scheduler import MemoryModel
+from lacosmic.scheduler import MIN_BYTES_PER_PIXEL
+
+SUBARRAY = 512 * 512
+FULL_FRAME = 2048 * 2048
+
+#-------------------------------------------------------------------------------#
+
+def test_small_jobs_keep_full_frame_estimate():
+    """Six 512x512 jobs that each grew by ~20 MB must not shrink the
+    estimate of a 2048x2048 frame below the ~280 MB it grows by.
+    """
+    model = MemoryModel('python')
+    for i in range(6):
+        model.update(SUBARRAY, 4, 20e6)
+    assert model.estimate(FULL_FRAME, 4) > 280e6
+
+
+def test_bytes_per_pixel_floor():
+    """Jobs that report no growth leave the model at its floor."""
+    model = MemoryModel('python')
+    for i in range(20):
+        model.update(SUBARRAY, 4, 0.)
+    assert model.bytes_per_pixel == MIN_BYTES_PER_PIXEL['python']
+
+
+def test_floor_applies_to_saved_model():
+    """A model file saved with a collapsed value is read back at the
+    floor.
+    """
+    model_file = os.path.join(tempfile.mkdtemp(), 'mem.json')
+    with open(model_file, 'w') as model:
+        json.dump({'python':1.56}, model)
+    model = MemoryModel('python', model_file)
+    assert model.bytes_per_pixel == MIN_BYTES_PER_PIXEL['python']
@@ -0,0 +1,107 @@
+"""
+Tests of :mod:`lacosmic.work_queue`, with several local workers
+sharing a queue in a temporary directory.
+
+Author:
+
+    C.M. Gosmeyer
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import pytest
+
+from lacosmic.work_queue import Heartbeat
+from lacosmic.work_queue import WorkQueue
+from lacosmic.work_queue import run_worker
+
+#-------------------------------------------------------------------------------#
+
+@pytest.fixture
+def queue_dir():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+def process(filename):
+    """Logs each job processed, and fails those named 'bad'."""
+    with open(os.path.join(os.path.dirname(filename), 'log'), 'a') as log:
+        log.write(os.path.basename(filename) + '\n')
+    if 'bad' in filename:
+        raise RuntimeError('bad FLT')
+
+
+def worker(queue_dir, name):
+    run_worker(WorkQueue(queue_dir), process, worker=name, heartbeat=0.1)
+
+
+#-------------------------------------------------------------------------------#
+
+def test_add_is_idempotent(queue_dir):
+    queue = WorkQueue(queue_dir)
+    assert queue.add('/data/ib0001_flt.fits')
+    assert not queue.add('/data/ib0001_flt.fits')
+    assert queue.counts()['pending'] == 1
+
+
+def test_workers_share_jobs(queue_dir):
+    """Three workers finish every job exactly once, and the job that
+    raises ends in failed/ with its traceback.
+    """
+    names = ['ib{0:04d}_flt.fits'.format(i) for i in range(20)] + \
+        ['bad_flt.fits']
+    queue = WorkQueue(queue_dir)
+    for name in names:
+        queue.add(os.path.join(queue_dir, name))
+
+    workers = [multiprocessing.Process(target=worker, \
+                                       args=(queue_dir, 'worker' + str(i))) \
+               for i in range(3)]
+    for proc in workers:
+        proc.start()
+    for proc in workers:
+        proc.join()
+
+    with open(os.path.join(queue_dir, 'log')) as log:
+        assert sorted(log.read().split()) == sorted(names)
+    counts = queue.counts()
+    assert counts['done'] == 20
+    assert counts['failed'] == 1
+    assert counts['pending'] == counts['claimed'] == 0
+    with open(queue.path('failed', 'bad_flt.err')) as err_file:
+        assert 'bad FLT' in err_file.read()
+
+
+def test_abandoned_claim_reclaimed(queue_dir):
+    """A claim with no heartbeat goes back to pending after
+    `stale_timeout`, and is then processed by another worker.
+    """
+    queue = WorkQueue(queue_dir, stale_timeout=0.5)
+    queue.add(os.path.join(queue_dir, 'ib0001_flt.fits'))
+    assert queue.claim('dead') is not None
+    assert queue.reclaim_stale() == []
+
+    time.sleep(0.7)
+    assert queue.reclaim_stale() == ['ib0001_flt']
+    run_worker(queue, process, worker='alive', heartbeat=0.1)
+    assert queue.counts()['done'] == 1
+
+
+def test_live_claim_kept(queue_dir):
+    """A claim whose heartbeat is running is not reclaimed."""
+    queue = WorkQueue(queue_dir, stale_timeout=0.5)
+    queue.add(os.path.join(queue_dir, 'ib0001_flt.fits'))
+    job = queue.claim('alive')
+    beat = Heartbeat(job[1], 0.1)
+    beat.start()
+    try:
+        time.sleep(1.2)
+        assert queue.reclaim_stale() == []
+    finally:
+        beat.stop()
+    assert queue.counts()['claimed'] == 1